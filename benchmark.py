@@ -0,0 +1,44 @@
+import argparse
+import sys
+
+from core import benchmark
+
+
+def main():
+	parser = argparse.ArgumentParser(description = 'Benchmarks of the game engine.')
+	commands = parser.add_subparsers(dest = 'command')
+	run = commands.add_parser('run', help = 'run benchmarks and save results as JSON')
+	run.add_argument('-o', '--output', default = None, help = 'path to the JSON results')
+	run.add_argument('-f', '--filter', default = None, help = 'substring of benchmark names')
+	run.add_argument('-s', '--sizes', default = None, help = 'board sizes, for example 3x3,3x4')
+	run.add_argument('--min-time', type = float, default = benchmark.MIN_TIME, help = 'minimal time of one measurement in seconds')
+	run.add_argument('--repeat', type = int, default = benchmark.REPEAT, help = 'count of measurements')
+	run.add_argument('-b', '--baseline', default = None, help = 'compare results with the JSON baseline')
+	run.add_argument('-t', '--threshold', type = float, default = benchmark.THRESHOLD, help = 'relative slowdown which is a regression')
+	compare = commands.add_parser('compare', help = 'compare JSON results with the JSON baseline')
+	compare.add_argument('baseline', help = 'path to the JSON baseline')
+	compare.add_argument('current', help = 'path to the JSON results')
+	compare.add_argument('-t', '--threshold', type = float, default = benchmark.THRESHOLD, help = 'relative slowdown which is a regression')
+	args = parser.parse_args()
+
+	if args.command == 'run':
+		sizes = benchmark.SIZES
+		if args.sizes is not None:
+			sizes = [tuple(int(x) for x in size.split('x')) for size in args.sizes.split(',')]
+		current = benchmark.run(sizes, args.filter, args.min_time, args.repeat)
+		if args.output is not None:
+			benchmark.save(args.output, current)
+		if args.baseline is None:
+			return 0
+		baseline = benchmark.load(args.baseline)
+	else:
+		baseline, current = benchmark.load(args.baseline), benchmark.load(args.current)
+
+	rows, regressions = benchmark.compare(baseline, current, args.threshold)
+	print benchmark.format_comparison(rows, regressions)
+	# non-zero exit code if there are regressions
+	return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
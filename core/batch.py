@@ -0,0 +1,150 @@
+# external imports:
+import numpy as np
+
+# internal imports:
+from gameboard import GameBoardException, STATUS, LABELS
+
+# ternary values of positions must be in int64
+MAX_CELLS = 39
+
+# preference of the enemy strength after a move: the best move makes the enemy losing
+MOVE_PREFERENCE = {STATUS.LOSING_FINAL : 3, STATUS.LOSING : 2, STATUS.DRAW : 1,
+                   STATUS.WINNING : 0, STATUS.WINNING_FINAL : 0}
+
+
+def positions_array(game_board, positions):
+    """
+    Positions as an array of label indicies.
+
+    Parameters
+    ----------
+    game_board (GameBoard):          a game board which defines the game rules.
+    positions (iterable or array):   positions in the text representation or array of label indicies.
+
+    Returns
+    ----------
+    (np.array) array with shape (count of positions, count of cells).
+    """
+    width = game_board.tmask_width
+    if isinstance(positions, np.ndarray):
+        if positions.ndim != 2 or positions.shape[1] != width:
+            raise GameBoardException('Positions array must have shape (count of positions, %d).' % width)
+        if np.any((positions < 0) | (positions >= len(LABELS))):
+            raise GameBoardException('Label indicies must be from 0 to %d.' % (len(LABELS) - 1))
+        return positions.astype(np.int8)
+    try:
+        # unicode positions (of JSON requests) are converted to byte strings
+        positions = [str(position) for position in positions]
+    except UnicodeEncodeError:
+        raise GameBoardException('Positions must consist of labels %r.' % ''.join(LABELS))
+    for position in positions:
+        if len(position) != width:
+            raise GameBoardException('Position length must be %d: %r' % (width, position))
+    # unknown labels are marked by -1
+    lookup = np.full(256, -1, dtype = np.int8)
+    for index, label in enumerate(LABELS):
+        lookup[ord(label)] = index
+    digits = lookup[np.frombuffer(''.join(positions), dtype = np.uint8)]
+    if np.any(digits < 0):
+        raise GameBoardException('Positions must consist of labels %r.' % ''.join(LABELS))
+    return digits.reshape(-1, width)
+
+
+def obvious_statuses(game_board, digits):
+    """
+    Stencils checking for all positions (see GameBoard.__status).
+
+    Returns
+    ----------
+    (np.array) statuses for the current players, STATUS.UNKNOWN if the game tree must be checked.
+    (np.array) game over flags.
+    """
+    x_count = (digits == 1).sum(axis = 1)
+    o_count = (digits == 2).sum(axis = 1)
+    if np.any((x_count != o_count) & (x_count != o_count + 1)):
+        raise GameBoardException('Positions are not possible: wrong count of X and O labels.')
+
+    statuses = np.full(len(digits), STATUS.UNKNOWN, dtype = np.int8)
+    if len(game_board.stencils) == 0:
+        return statuses, x_count + o_count == game_board.tmask_width
+    # labels in stencils: (positions, stencils, stencil cells)
+    stencil_labels = digits[:, np.array(game_board.stencils)]
+    x_in = (stencil_labels == 1).any(axis = 2)
+    o_in = (stencil_labels == 2).any(axis = 2)
+    x_win = (stencil_labels == 1).all(axis = 2).any(axis = 1)
+    o_win = (stencil_labels == 2).all(axis = 2).any(axis = 1)
+    alive = (~(x_in & o_in)).any(axis = 1)
+
+    player_win = np.where(x_count == o_count, x_win & ~o_win, o_win & ~x_win)
+    if np.any(player_win):
+        raise GameBoardException('Positions are not possible: the current player wins.')
+    statuses[~alive] = STATUS.DRAW
+    statuses[x_win | o_win] = STATUS.LOSING_FINAL
+    game_over = (x_win | o_win) | (x_count + o_count == game_board.tmask_width)
+    return statuses, game_over
+
+
+def symmetry_keys(game_board, digits):
+    """
+    Returns
+    ----------
+    (np.array) ternary values of equivalent positions with shape (count of positions, count of symmetries).
+    """
+    weights = np.array(game_board.symmetry_weights, dtype = np.int64)
+    return digits.astype(np.int64).dot(weights.T)
+
+
+def evaluate_many(game_board, positions):
+    """
+    Batch evaluation of positions (see GameBoard.evaluate_many).
+    """
+    if game_board.tmask_width > MAX_CELLS:
+        raise GameBoardException('The board with %d cells is too large for the batch evaluation.' % game_board.tmask_width)
+    digits = positions_array(game_board, positions)
+    count, size = digits.shape
+    statuses, game_over = obvious_statuses(game_board, digits)
+    keys = symmetry_keys(game_board, digits)
+    weights = np.array(game_board.symmetry_weights, dtype = np.int64).T
+
+    memory = game_board.memory
+    to_text = lambda row : ''.join(LABELS[d] for d in row)
+
+    def strengths_of(uids, rows_digits):
+        # the solved table is used for all equal unique ids, missing positions are solved
+        unique, first, inverse = np.unique(uids, return_index = True, return_inverse = True)
+        values = np.empty(len(unique), dtype = np.int8)
+        for j, uid in enumerate(unique.tolist()):
+            value = memory.get(uid)
+            if value is None:
+                value = game_board.position_strength(to_text(rows_digits[first[j]]))
+            values[j] = value
+        return values[inverse]
+
+    strengths = statuses.copy()
+    unknown = np.flatnonzero(statuses == STATUS.UNKNOWN)
+    if len(unknown):
+        strengths[unknown] = strengths_of(keys[unknown].min(axis = 1), digits[unknown])
+
+    # the best moves by strengths of the next positions
+    best_moves = np.full(count, -1, dtype = np.int32)
+    best_preference = np.full(count, -1, dtype = np.int8)
+    movable = np.flatnonzero(~game_over)
+    x_moves = (digits[movable] == 1).sum(axis = 1) == (digits[movable] == 2).sum(axis = 1)
+    label_index = np.where(x_moves, 1, 2)
+    preference = np.full(max(MOVE_PREFERENCE) + 1, -1, dtype = np.int8)
+    for status, value in MOVE_PREFERENCE.iteritems():
+        preference[status] = value
+    for cell in xrange(size):
+        empty = digits[movable, cell] == 0
+        rows = movable[empty]
+        if len(rows) == 0:
+            continue
+        child_digits = digits[rows].copy()
+        child_digits[:, cell] = label_index[empty]
+        child_uids = (keys[rows] + np.outer(label_index[empty], weights[cell])).min(axis = 1)
+        child_preference = preference[strengths_of(child_uids, child_digits)]
+        better = child_preference > best_preference[rows]
+        best_moves[rows[better]] = cell
+        best_preference[rows[better]] = child_preference[better]
+
+    return strengths, game_over, best_moves
@@ -0,0 +1,232 @@
+# external imports:
+import json
+import platform
+import random
+import sys
+from time import time, strftime
+
+# internal imports:
+from bifilter import BinaryFilter
+from gameboard import GameBoard, GameBoardException, STATUS
+from player import AI
+from table import REGISTRY
+
+
+# board sizes of benchmarks
+SIZES = [(3, 3), (3, 4), (4, 3)]
+# minimal time of one measurement and count of measurements (the best one is used)
+MIN_TIME = 0.2
+REPEAT = 3
+# relative slowdown which is reported as a regression
+THRESHOLD = 0.1
+
+
+def measure(func, min_time = MIN_TIME, repeat = REPEAT):
+    """
+    Time of one call: the count of calls is doubled until a measurement takes min_time,
+    the best of repeat measurements is used.
+
+    Parameters
+    ----------
+    func (callable):   function without arguments.
+    min_time (float):  minimal time of one measurement in seconds.
+    repeat (int):      count of measurements.
+
+    Returns
+    ----------
+    (float) seconds per call.
+    """
+    number = 1
+    while True:
+        t = time()
+        for _ in xrange(number):
+            func()
+        elapsed = time() - t
+        if elapsed >= min_time:
+            break
+        number *= 2
+    best = elapsed / number
+    for _ in xrange(repeat - 1):
+        t = time()
+        for _ in xrange(number):
+            func()
+        best = min(best, (time() - t) / number)
+    return best
+
+
+def game_positions(game_board, seed = 0):
+    """
+    Opening, middle game and endgame positions of a random game.
+
+    Returns
+    ----------
+    (dict) positions in the text representation by the game stage.
+    """
+    rnd = random.Random(seed)
+    size = game_board.tmask_width
+    stages = {'opening' : 0, 'middle' : size // 3, 'endgame' : 2 * size // 3}
+    positions = {}
+    for stage, moves in stages.iteritems():
+        while stage not in positions:
+            position = list(' ' * size)
+            for k, i in enumerate(rnd.sample(xrange(size), moves)):
+                position[i] = 'XO'[k % 2]
+            position = ''.join(position)
+            try:
+                if game_board.position_status(position) == STATUS.UNKNOWN:
+                    positions[stage] = position
+            except GameBoardException:
+                # the player which moves is the winner
+                continue
+    return positions
+
+
+def micro_benchmarks(height, width):
+    """
+    Returns
+    ----------
+    (list) pairs of benchmark name and function: stencils checking, unique id,
+           available positions and binary filter indicies.
+    """
+    prefix = '%dx%d.' % (height, width)
+    text_board = GameBoard(height, width)
+    bit_board = GameBoard(height, width, bitboard = True)
+    position = game_positions(text_board)['middle']
+    bit_board.position = position
+    stencils_filter = BinaryFilter(len(text_board.stencils))
+    stencils_filter.drop_index(0)
+    return [(prefix + 'status.text', lambda : text_board.position_status(position)),
+            (prefix + 'status.bitboard', lambda : bit_board.position_status(bit_board.bitboard)),
+            (prefix + 'unique_id.text', lambda : text_board.unique_id(position)),
+            (prefix + 'unique_id.bitboard', lambda : bit_board.unique_id(bit_board.bitboard)),
+            (prefix + 'available_positions.text', lambda : text_board.available_positions(position)),
+            (prefix + 'available_positions.bitboard', lambda : bit_board.available_positions(position)),
+            (prefix + 'bifilter.indicies', stencils_filter.indicies)]
+
+
+def macro_benchmarks(height, width):
+    """
+    Returns
+    ----------
+    (list) pairs of benchmark name and function: the full solve, cold and warm
+           game board construction and AI moves in the game stages.
+    """
+    prefix = '%dx%d.' % (height, width)
+    def solve(bitboard):
+        game_board = GameBoard(height, width, bitboard = bitboard)
+        def run():
+            game_board.memory = {}
+            game_board.position_strength(game_board.position)
+        return run
+
+    def construct(cold):
+        table_key = GameBoard(height, width).table_key()
+        def run():
+            if cold:
+                REGISTRY.evict(table_key)
+            GameBoard(height, width)
+        return run
+
+    def ai_move(position):
+        game_board = GameBoard(height, width, bitboard = True)
+        ai = AI()
+        def run():
+            game_board.position = position
+            ai.move(game_board)
+        return run
+
+    benchmarks = [(prefix + 'solve.text', solve(False)),
+                  (prefix + 'solve.bitboard', solve(True)),
+                  (prefix + 'construct.cold', construct(True)),
+                  (prefix + 'construct.warm', construct(False))]
+    positions = game_positions(GameBoard(height, width))
+    for stage in ['opening', 'middle', 'endgame']:
+        benchmarks.append((prefix + 'ai_move.' + stage, ai_move(positions[stage])))
+    return benchmarks
+
+
+def run(sizes = SIZES, name_filter = None, min_time = MIN_TIME, repeat = REPEAT, output = sys.stdout):
+    """
+    Run benchmarks.
+
+    Parameters
+    ----------
+    sizes (list):         list of (height, width) pairs.
+    name_filter (str):    substring of benchmark names or None for all benchmarks.
+    min_time (float):     minimal time of one measurement in seconds.
+    repeat (int):         count of measurements.
+    output (file):        stream for the progress or None.
+
+    Returns
+    ----------
+    (dict) results: 'meta' information and 'results' as seconds per call by benchmark name.
+    """
+    results = {}
+    for height, width in sizes:
+        for name, func in micro_benchmarks(height, width) + macro_benchmarks(height, width):
+            if name_filter is not None and name_filter not in name:
+                continue
+            random.seed(0)
+            results[name] = measure(func, min_time, repeat)
+            if output is not None:
+                output.write('%-40s %12.3f us\n' % (name, 1e6 * results[name]))
+    meta = {'date' : strftime('%Y-%m-%d %H:%M:%S'), 'python' : platform.python_version(),
+            'platform' : platform.platform(), 'min_time' : min_time, 'repeat' : repeat}
+    return {'meta' : meta, 'results' : results}
+
+
+def save(fname, report):
+    with open(fname, 'w') as f:
+        json.dump(report, f, indent = 2, sort_keys = True)
+
+
+def load(fname):
+    with open(fname) as f:
+        return json.load(f)
+
+
+def compare(baseline, current, threshold = THRESHOLD):
+    """
+    Compare benchmark results with the baseline.
+
+    Parameters
+    ----------
+    baseline (dict):    baseline report (see run).
+    current (dict):     current report.
+    threshold (float):  relative slowdown which is a regression.
+
+    Returns
+    ----------
+    (list) tuples (name, baseline seconds, current seconds, ratio) of common benchmarks.
+    (list) names of regressions.
+    """
+    rows, regressions = [], []
+    base_results, current_results = baseline['results'], current['results']
+    for name in sorted(set(base_results) & set(current_results)):
+        ratio = current_results[name] / base_results[name] if base_results[name] else float('inf')
+        rows.append((name, base_results[name], current_results[name], ratio))
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def format_comparison(rows, regressions):
+    """
+    Returns
+    ----------
+    (str) the comparison table in the text representation.
+    """
+    lines = ['%-40s %12s %12s %8s' % ('benchmark', 'baseline us', 'current us', 'ratio')]
+    for name, base, current, ratio in rows:
+        mark = '  REGRESSION' if name in regressions else ''
+        lines.append('%-40s %12.3f %12.3f %8.2f%s' % (name, 1e6 * base, 1e6 * current, ratio, mark))
+    lines.append('%d regressions of %d benchmarks' % (len(regressions), len(rows)))
+    return '\n'.join(lines)
+
+
+def main():
+    run(sizes = [(3, 3)], min_time = 0.05, repeat = 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+from bifilter import BinaryFilter
+
+
+class BitBoardException(Exception):
+    def __init__(self, message):
+        super(BitBoardException, self).__init__(message)
+
+
+class BitBoard(object):
+    def __init__(self, height, width, stencils, labels = " XO", cell_weights = None):
+        """
+        Bitboard engine: a game board position as two integer masks.
+
+        Parameters
+        ----------
+        height   (int):       tic tac toe board height.
+        width    (int):       tic tac toe board width.
+        stencils (list):      list of stencil indicies (see GameBoard.__make_stencils).
+        labels   (str):       empty, X and O labels for the text representation.
+        cell_weights (list):  ternary weights of every cell for equivalent positions or None.
+        """
+        self.height = height
+        self.width = width
+        self.labels = labels
+        self.size = height * width
+        # stencils as integer masks: bit i is up if the stencil contains the cell i
+        self.stencil_masks = [reduce(BinaryFilter.bit_up, stencil, 0) for stencil in stencils]
+        # bitmasks of the stencils indicies which pass through every cell
+        self.cell_stencils = [0] * self.size
+        for i, stencil in enumerate(stencils):
+            for index in stencil:
+                self.cell_stencils[index] = BinaryFilter.bit_up(self.cell_stencils[index], i)
+        # bitmasks of X and O labels
+        self.x_mask = 0
+        self.o_mask = 0
+        # count of labels on the board
+        self.moves = 0
+        # ternary values of equivalent positions, they are updated on make/unmake moves
+        self.cell_weights = cell_weights if cell_weights is not None else [(3**(self.size - i - 1),) for i in xrange(self.size)]
+        self.keys = [0] * len(self.cell_weights[0])
+
+    def copy(self):
+        """
+        Returns
+        ----------
+        (BitBoard) a copy of the board which shares the precomputed stencil masks.
+        """
+        board = BitBoard.__new__(BitBoard)
+        board.__dict__.update(self.__dict__)
+        return board
+
+    def load(self, position):
+        """
+        Set the board state by a position in the text representation.
+
+        Parameters
+        ----------
+        position  (str):   a position in the text representation.
+        """
+        E_LABEL, X_LABEL, O_LABEL = self.labels
+        x_mask, o_mask = 0, 0
+        for i, label in enumerate(position):
+            if label == X_LABEL:
+                x_mask |= 1 << i
+            elif label == O_LABEL:
+                o_mask |= 1 << i
+        self.x_mask, self.o_mask = x_mask, o_mask
+        self.moves = position.count(X_LABEL) + position.count(O_LABEL)
+
+        self.keys = [0] * len(self.keys)
+        for i, label in enumerate(position):
+            if label != E_LABEL:
+                self.__update_keys(i, 1 if label == X_LABEL else 2)
+
+    def __update_keys(self, index, digit):
+        """
+        Add the ternary digit of the cell to the values of all equivalent positions.
+        """
+        self.keys = [key + digit * weight for key, weight in zip(self.keys, self.cell_weights[index])]
+
+    @property
+    def position(self):
+        """
+        (str) the text representation of the board (a view for the text and Qt frontends).
+        """
+        E_LABEL, X_LABEL, O_LABEL = self.labels
+        x_mask, o_mask = self.x_mask, self.o_mask
+        return ''.join([X_LABEL if (x_mask >> i) & 1 else (O_LABEL if (o_mask >> i) & 1 else E_LABEL)
+                        for i in xrange(self.size)])
+
+    def label(self, index):
+        """
+        Returns
+        ----------
+        (str) the label in the cell with some index.
+        """
+        bit = 1 << index
+        if self.x_mask & bit:
+            return self.labels[1]
+        elif self.o_mask & bit:
+            return self.labels[2]
+        else:
+            return self.labels[0]
+
+    def player_index(self):
+        """
+        Returns
+        ----------
+        (int) 0 if X player moves from the current position, 1 for O player.
+        """
+        return self.moves & 1
+
+    def empty_indicies(self):
+        """
+        Returns
+        ----------
+        (list) indicies of the empty cells.
+        """
+        occupied = self.x_mask | self.o_mask
+        return [i for i in xrange(self.size) if not occupied & (1 << i)]
+
+    def make_move(self, index):
+        """
+        Put the label of the current player into the cell.
+
+        Parameters
+        ----------
+        index  (int):   index of an empty cell.
+        """
+        bit = 1 << index
+        if (self.x_mask | self.o_mask) & bit:
+            raise BitBoardException('The cell %d is not empty.' % index)
+        if self.moves & 1:
+            self.o_mask |= bit
+            self.__update_keys(index, 2)
+        else:
+            self.x_mask |= bit
+            self.__update_keys(index, 1)
+        self.moves += 1
+
+    def unmake_move(self, index):
+        """
+        Take back the last move which was made into the cell.
+
+        Parameters
+        ----------
+        index  (int):   index of the last move.
+        """
+        self.moves -= 1
+        bit = ~(1 << index)
+        if self.moves & 1:
+            self.o_mask &= bit
+            self.__update_keys(index, -2)
+        else:
+            self.x_mask &= bit
+            self.__update_keys(index, -1)
+
+    def scan(self, stencils_filter, move = None):
+        """
+        Stencils checking by AND/compare operations.
+
+        Parameters
+        ----------
+        stencils_filter (BinaryFilter):  allowed stencils.
+        move (int):                      index of the last move: only stencils through the move are checked.
+
+        Returns
+        ----------
+        (list) count of the first and the second players winning combinations.
+        (BinaryFilter) allowed stencils after checking.
+        """
+        wining_count = [0, 0]
+        new_stencils_filter = BinaryFilter(stencils_filter)
+        x_mask, o_mask = self.x_mask, self.o_mask
+
+        bitmask = stencils_filter.bitmask
+        if move is not None:
+            bitmask &= self.cell_stencils[move]
+        while bitmask:
+            lowest = bitmask & -bitmask
+            bitmask ^= lowest
+            i = lowest.bit_length() - 1
+            mask = self.stencil_masks[i]
+            x_in, o_in = x_mask & mask, o_mask & mask
+            if x_in and o_in:
+                # 'X' and 'O' labels inside this stencil:
+                # this stencil is not need anymore.
+                new_stencils_filter.drop_index(i)
+            elif x_in == mask:
+                wining_count[0] += 1
+            elif o_in == mask:
+                wining_count[1] += 1
+
+        return wining_count, new_stencils_filter
@@ -0,0 +1,206 @@
+# external imports:
+import mmap
+import os
+import struct
+from random import randint
+
+# internal imports:
+from gameboard import GameBoard, STATUS, E_LABEL
+from table import REGISTRY, TableException, symmetries_checksum
+
+
+# Binary book format of the best moves:
+#   header (see HEADER), then entries (unique id, bitmask of the best moves) sorted by unique id.
+#   Moves are cells of the canonical position (see GameBoard.canonical_form).
+MAGIC = 'TTTM'
+VERSION = 2
+# magic, version, height, width, winning length, count of symmetries, symmetries checksum, count of entries
+HEADER = struct.Struct('<4sHBBBBIQ')
+ENTRY = struct.Struct('<QQ')
+# unique id of an entry
+ENTRY_KEY = struct.Struct('<Q')
+
+
+def best_moves(game_board, position):
+    """
+    The best moves by strengths and depths of the next positions:
+    the fastest win, the longest resistance or any draw.
+
+    Parameters
+    ----------
+    game_board (GameBoard): a game board which defines the game rules.
+    position  (str):        a position in the text representation.
+
+    Returns
+    ----------
+    (list) indicies of cells.
+    """
+    strength = game_board.position_strength(position)
+    player_label = game_board.player_label(position)
+    moves = {}
+    for i, label in enumerate(position):
+        if label == E_LABEL:
+            next_position = position[:i] + player_label + position[i + 1:]
+            moves[i] = (game_board.position_strength(next_position), next_position)
+
+    if strength in [STATUS.WINNING, STATUS.WINNING_FINAL]:
+        candidates = [i for i, (s, _) in moves.iteritems() if s == STATUS.LOSING_FINAL]
+        if candidates:
+            return sorted(candidates)
+        candidates = [i for i, (s, _) in moves.iteritems() if s == STATUS.LOSING]
+        fastest = True
+    elif strength in [STATUS.LOSING, STATUS.LOSING_FINAL]:
+        candidates = moves.keys()
+        fastest = False
+    else:
+        return sorted(i for i, (s, _) in moves.iteritems() if s == STATUS.DRAW)
+
+    depths = dict((i, game_board.position_depth(moves[i][1])) for i in candidates)
+    best_depth = min(depths.values()) if fastest else max(depths.values())
+    return sorted(i for i in candidates if depths[i] == best_depth)
+
+
+def build_book(game_board):
+    """
+    The best moves of all positions of the game tree till the game over.
+
+    Parameters
+    ----------
+    game_board (GameBoard): a game board which defines the game rules.
+
+    Returns
+    ----------
+    (dict) bitmasks of the best moves of canonical positions by unique ids.
+    """
+    book = {}
+    for position, _, status, _ in game_board.iter_positions():
+        if E_LABEL not in position or status == STATUS.LOSING_FINAL:
+            continue
+        uid, permutation = game_board.canonical_form(position)
+        canonical = ''.join(position[index] for index in permutation)
+        book[uid] = sum(1 << i for i in best_moves(game_board, canonical))
+    return book
+
+
+def save_book(fname, book, height, width, permutations, winning_len = None):
+    """
+    Save the book of the best moves.
+
+    Parameters
+    ----------
+    fname (str):           path to output file.
+    book (dict):           bitmasks of the best moves by unique ids (see build_book).
+    height  (int):         tic tac toe board height.
+    width   (int):         tic tac toe board width.
+    permutations (list):   equivalent permutations which are used for unique ids.
+    winning_len (int):     length of winning combinations, default is min(height, width).
+    """
+    if winning_len is None: winning_len = min(height, width)
+    if height * width > 64:
+        raise TableException('Moves of the board %dx%d can not be stored in 64 bits.' % (height, width))
+    tmp_fname = fname + '.tmp'
+    with open(tmp_fname, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, height, width, winning_len, len(permutations),
+                            symmetries_checksum(permutations), len(book)))
+        for uid in sorted(book):
+            f.write(ENTRY.pack(uid, book[uid]))
+    os.rename(tmp_fname, fname)
+
+
+class MoveBook(object):
+    def __init__(self, fname, game_board):
+        """
+        The book of the best moves: an AI move is one lookup and one permutation.
+        The book is memory-mapped: entries are found by binary search of unique ids in the file.
+
+        Parameters
+        ----------
+        fname (str):             path to the book file.
+        game_board (GameBoard):  a game board which defines the game rules.
+        """
+        if os.path.getsize(fname) < HEADER.size:
+            raise TableException('%s is not a book file of version %d.' % (fname, VERSION))
+        with open(fname, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        magic, version, height, width, winning_len, symmetries_count, checksum, count = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION or len(self.data) < HEADER.size + count * ENTRY.size:
+            raise TableException('%s is not a book file of version %d.' % (fname, VERSION))
+        permutations = game_board.eq_permutations
+        if (height, width, winning_len) != (game_board.height, game_board.width, game_board.winning_len) or \
+                (symmetries_count, checksum) != (len(permutations), symmetries_checksum(permutations)):
+            raise TableException('The book %s is made for other game rules.' % fname)
+        self.game_board = game_board
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def mask(self, uid):
+        """
+        Returns
+        ----------
+        (int) bitmask of the best moves of the canonical position by unique id or None if it is not in the book.
+        """
+        data = self.data
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if ENTRY_KEY.unpack_from(data, HEADER.size + middle * ENTRY.size)[0] < uid:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count:
+            key, mask = ENTRY.unpack_from(data, HEADER.size + low * ENTRY.size)
+            if key == uid:
+                return mask
+        return None
+
+    def best_moves(self, position):
+        """
+        Returns
+        ----------
+        (list) indicies of cells of the best moves in the position or None if the position is not in the book.
+        """
+        uid, permutation = self.game_board.canonical_form(position)
+        mask = self.mask(uid)
+        if mask is None:
+            return None
+        # cells of the canonical position are mapped back to the actual board
+        return sorted(permutation[k] for k in xrange(len(permutation)) if mask >> k & 1)
+
+    def move(self, position):
+        """
+        Returns
+        ----------
+        (int) index of a random cell of the best moves or None if the position is not in the book.
+        """
+        moves = self.best_moves(position)
+        if not moves:
+            return None
+        return moves[randint(0, len(moves) - 1)]
+
+
+def load_book(game_board):
+    """
+    Returns
+    ----------
+    (MoveBook) the book of the game board from the dump directory or None,
+               it is loaded once per process (see table.REGISTRY).
+    """
+    def load():
+        fname = os.path.join(game_board.cur_dir, 'dump', game_board.dump_name('book'))
+        return MoveBook(fname, game_board) if os.path.exists(fname) else None
+    return REGISTRY.get(game_board.table_key() + ('book',), load)
+
+
+def main():
+    from time import time
+    for h, w in [(3, 3), (3, 4), (4, 3)]:
+        gb = GameBoard(h, w)
+        t = time()
+        book = build_book(gb)
+        print 'board size %dx%d: %d positions, time %.2f' % (h, w, len(book), time() - t)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+# external imports:
+import sys
+from multiprocessing import Pool, cpu_count
+from os import makedirs, remove
+from os.path import dirname, abspath, exists, getsize, isdir, join
+from time import time
+
+# internal imports:
+from book import build_book, save_book, MoveBook
+from gameboard import GameBoard
+from parallel import solve_tables
+from table import MemoryTable, TableException, VERSION, RANKED_VERSION, RAW_VERSION, COMPLETE, DEPTHS
+
+
+# default tables: (height, width, winning length or None for the default)
+SIZES = [(3, 3, None), (3, 4, None), (4, 3, None)]
+SOLVERS = ['full', 'negamax', 'retrograde']
+# completeness flags of tables of solvers (see table module): the negamax table contains exactly solved
+# positions only, the retrograde table contains all reachable positions without depths
+SOLVER_FLAGS = {'full' : COMPLETE | DEPTHS, 'negamax' : 0, 'retrograde' : COMPLETE}
+# maximal count of cells of boards of the full solver: its game tree is enumerated in pure Python
+# and depths and the book are calculated for every reachable position
+MAX_FULL_CELLS = 16
+# binary table of positions of the table, binary tables of all valid positions or all ternary values
+# (see table module) or pickled dictionary
+FORMATS = ['tbl', 'ranked', 'raw', 'pkl']
+# table versions of binary formats
+TABLE_VERSIONS = {'tbl' : VERSION, 'ranked' : RANKED_VERSION, 'raw' : RAW_VERSION}
+# default directory of tables
+DUMP_DIR = join(dirname(abspath(__file__)), 'dump')
+# columns of the report
+REPORT_HEADER = '%-7s %3s %-10s %-6s %10s %10s %11s %10s %9s' % (
+    'board', 'k', 'solver', 'format', 'nodes', 'positions', 'table bytes', 'book bytes', 'seconds')
+
+
+def parse_size(size):
+    """
+    Parameters
+    ----------
+    size (str): 'HxW' or 'HxW:K' where K is the winning length.
+
+    Returns
+    ----------
+    (tuple) height, width and winning length or None.
+    """
+    board, _, winning_len = size.partition(':')
+    height, width = [int(x) for x in board.lower().split('x')]
+    return height, width, int(winning_len) if winning_len else None
+
+
+def check_size(height, width, solver):
+    """
+    Raise TableException if the board is too large for the solver (see MAX_FULL_CELLS).
+    """
+    if solver == 'full' and height * width > MAX_FULL_CELLS:
+        raise TableException('The full solve of the board %dx%d is not supported: boards of the full solver '
+                             'have at most %d cells, use the negamax or retrograde solver.' %
+                             (height, width, MAX_FULL_CELLS))
+
+
+def table_path(game_board, path, fmt):
+    return join(path, game_board.dump_name('pkl' if fmt == 'pkl' else 'tbl'))
+
+
+def up_to_date(game_board, path, fmt, solver = 'full'):
+    """
+    Parameters
+    ----------
+    solver (str): solver engine name (see SOLVERS), the book of the best moves is made by the full solver only.
+
+    Returns
+    ----------
+    (bool) True if the table and the book of the game board exist, they are made for
+           the game rules, the table is in the format and it is as complete as the table of the solver.
+    """
+    fname = table_path(game_board, path, fmt)
+    book_fname = join(path, game_board.dump_name('book'))
+    book = solver == 'full'
+    if not exists(fname) or (book and not exists(book_fname)):
+        return False
+    if fmt != 'tbl' and not book:
+        # the solver is not recorded in other formats: their tables of other solvers are rebuilt,
+        # and the book is removed by them (see build_table)
+        return False
+    try:
+        if book:
+            MoveBook(book_fname, game_board)
+        if fmt == 'pkl':
+            return True
+        table = MemoryTable(fname)
+        table.check(game_board.height, game_board.width, game_board.eq_permutations, game_board.winning_len)
+    except TableException:
+        return False
+    if table.version != TABLE_VERSIONS[fmt]:
+        return False
+    return table.flags is None or table.flags & SOLVER_FLAGS[solver] == SOLVER_FLAGS[solver]
+
+
+def build_table(task):
+    """
+    Worker process function: solve the game tree, calculate depths, make the book
+    and save the table and the book. Depths and the book are made by the full solver only,
+    tables of other solvers contain strengths only. The game tree of the full solver can be
+    solved before by parallel.solve_tables (see build).
+
+    Parameters
+    ----------
+    task (tuple): height, width, winning length, solver name, format, output directory,
+                  directory of solver caches or None and the solve of parallel.solve_tables or None:
+                  the solved memory, the sum of nodes of worker processes and seconds of the solve.
+
+    Returns
+    ----------
+    (dict) report: board, winning length, solver, format, nodes (distinct calculated positions),
+           positions, the flag of depths and the book, sizes of files in bytes, seconds of the solve
+           and the total time. Reports of parallel solves have the sum of nodes of worker processes
+           (subtrees of workers share positions).
+    """
+    height, width, winning_len, solver, fmt, path, cache_dir, solved = task
+    check_size(height, width, solver)
+    gb = GameBoard(height, width, bitboard = True, winning_len = winning_len)
+    t = time()
+    cache = None
+    if solver == 'full' and cache_dir is not None:
+        # the solve is resumed from the last checkpoint of the cache
+        cache = gb.use_cache(join(cache_dir, gb.dump_name('db')))
+    else:
+        # the game board uses the existing table, the new one is made from scratch
+        gb.memory, gb.depths = {}, {}
+    solver_nodes = 0
+    worker_nodes = None
+    if solved is not None:
+        # every position of the merged memory is calculated once by the main process or some worker
+        gb.memory, worker_nodes, solve_seconds = solved
+        solver_nodes = len(gb.memory)
+        # the time of the solve is a part of the time of the table
+        t -= solve_seconds
+    elif solver == 'full':
+        gb.position_strength(gb.position)
+    else:
+        # the negamax dump contains exactly solved positions only,
+        # the retrograde dump contains all reachable positions
+        from solver import make_solver
+        engine = make_solver(solver, gb)
+        engine.solve(gb.position)
+        solver_nodes = getattr(engine, 'nodes', 0)
+        gb.memory.update(engine.memory())
+    solve_seconds = time() - t
+    book = None
+    if solver == 'full':
+        # depths are calculated by the solved strengths for the book and the table
+        gb.fill_depths()
+        book = build_book(gb)
+    # depths and the book need strengths of the whole game tree (see GameBoard.fill_depths),
+    # so tables of other solvers contain strengths only
+    if cache is not None:
+        cache.checkpoint()
+
+    fname = table_path(gb, path, fmt)
+    book_fname = join(path, gb.dump_name('book'))
+    gb.save_memory_dump(fname, version = TABLE_VERSIONS.get(fmt), solver = solver, flags = SOLVER_FLAGS[solver])
+    book_bytes = 0
+    if book is not None:
+        save_book(book_fname, book, gb.height, gb.width, gb.eq_permutations, gb.winning_len)
+        book_bytes = getsize(book_fname)
+    elif exists(book_fname):
+        # the book of the replaced table is removed, so the next full build is not up to date
+        remove(book_fname)
+    report = {'board' : '%dx%d' % (height, width), 'k' : gb.winning_len, 'solver' : solver, 'format' : fmt,
+              'nodes' : solver_nodes + gb.stats.nodes, 'positions' : len(gb.memory),
+              'depths' : book is not None, 'book_positions' : len(book) if book is not None else 0,
+              'table_bytes' : getsize(fname), 'book_bytes' : book_bytes,
+              'solve_seconds' : solve_seconds, 'seconds' : time() - t, 'skipped' : False}
+    if worker_nodes is not None:
+        report['worker_nodes'] = worker_nodes
+    if cache is not None:
+        cache.close()
+    return report
+
+
+def build(sizes = SIZES, solver = 'full', fmt = 'tbl', jobs = 1, path = DUMP_DIR, force = False,
+          cache_dir = None, output = sys.stdout):
+    """
+    Build tables and books of the best moves. Game trees of tables of the full solver are solved
+    together by jobs processes (see parallel module), then their tables are built one by one;
+    other tables (and solves through caches) are built by a pool of jobs processes.
+
+    Parameters
+    ----------
+    sizes (list):      list of (height, width, winning length or None).
+    solver (str):      solver engine name (see SOLVERS).
+    fmt (str):         format of tables (see FORMATS).
+    jobs (int):        count of worker processes, None is count of CPU.
+    path (str):        output directory.
+    force (bool):      rebuild tables which are up to date (see up_to_date).
+    cache_dir (str):   directory of persistent solver caches for the full solver (see cache module) or None.
+    output (file):     stream for reports of built tables or None.
+
+    Returns
+    ----------
+    (list) reports of tables in the order of sizes (see build_table), skipped tables have 'skipped' flag.
+    """
+    if fmt not in FORMATS:
+        raise TableException('Unknown format: %s. Available formats: %s' % (fmt, ', '.join(FORMATS)))
+    if jobs is None: jobs = cpu_count()
+    for height, width, _ in sizes:
+        check_size(height, width, solver)
+    for directory in [path, cache_dir]:
+        if directory is not None and not isdir(directory):
+            makedirs(directory)
+    if output is not None:
+        output.write(REPORT_HEADER + '\n')
+    split = solver == 'full' and cache_dir is None and jobs > 1
+    reports = [None] * len(sizes)
+    tasks = []
+    for index, (height, width, winning_len) in enumerate(sizes):
+        gb = GameBoard(height, width, winning_len = winning_len)
+        if not force and up_to_date(gb, path, fmt, solver):
+            reports[index] = {'board' : '%dx%d' % (height, width), 'k' : gb.winning_len, 'solver' : solver,
+                              'format' : fmt, 'skipped' : True}
+            if output is not None:
+                output.write(format_line(reports[index]) + '\n')
+            continue
+        tasks.append((index, (height, width, winning_len, solver, fmt, path, cache_dir, None)))
+
+    if split and tasks:
+        # board sizes are solved concurrently by the same pool, the time of the solve is divided between them
+        sizes = [task[:3] for _, task in tasks]
+        t = time()
+        memories, nodes = solve_tables(sizes, processes = jobs)
+        solve_seconds = (time() - t) / len(sizes)
+        tasks = [(index, task[:-1] + ((memories[size], nodes[size], solve_seconds),))
+                 for (index, task), size in zip(tasks, sizes)]
+    jobs = 1 if split else max(1, min(jobs, len(tasks)))
+    pool = Pool(jobs) if jobs > 1 else None
+    try:
+        results = pool.imap(build_table, [task for _, task in tasks]) if pool is not None else \
+            (build_table(task) for _, task in tasks)
+        for (index, _), report in zip(tasks, results):
+            reports[index] = report
+            if output is not None:
+                output.write(format_line(report) + '\n')
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return reports
+
+
+def format_line(report):
+    """
+    Returns
+    ----------
+    (str) the report of one table in the text representation.
+    """
+    prefix = '%-7s %3d %-10s %-6s' % (report['board'], report['k'], report['solver'], report['format'])
+    if report['skipped']:
+        return prefix + ' up to date'
+    line = prefix + ' %10d %10d %11d %10s %9.2f' % (report['nodes'], report['positions'], report['table_bytes'],
+                                                    report['book_bytes'] if report['depths'] else '-', report['seconds'])
+    if not report['depths']:
+        line += '  strengths only: no depths, no book'
+    return line
+
+
+def format_totals(reports):
+    """
+    Returns
+    ----------
+    (str) counts of built and skipped tables, total bytes and seconds of built tables.
+    """
+    built = [report for report in reports if not report['skipped']]
+    return '%d tables built, %d up to date, %d bytes, %.2f seconds' % (
+        len(built), len(reports) - len(built), sum(r['table_bytes'] + r['book_bytes'] for r in built),
+        sum(r['seconds'] for r in built))
+
+
+def format_report(reports):
+    """
+    Returns
+    ----------
+    (str) reports of tables and totals in the text representation.
+    """
+    lines = [REPORT_HEADER] + [format_line(report) for report in reports] + [format_totals(reports)]
+    return '\n'.join(lines)
+
+
+def main():
+    print format_report(build(output = None))
+
+
+if __name__ == '__main__':
+    main()
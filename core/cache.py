@@ -0,0 +1,198 @@
+# external imports:
+import sqlite3
+from collections import OrderedDict
+from time import time
+
+# internal imports:
+from table import TableException, symmetries_checksum
+
+
+# count of the recently used values in the memory (the hot set) of every dictionary
+HOT_SIZE = 2**18
+# new values are written to the disk by checkpoints: after CHECKPOINT_VALUES values or CHECKPOINT_SECONDS seconds
+CHECKPOINT_VALUES = 50000
+CHECKPOINT_SECONDS = 60.0
+
+
+class DiskDict(object):
+    def __init__(self, connection, name, hot_size = HOT_SIZE, on_write = None):
+        """
+        Dictionary of integer values by unique ids in the SQLite table with the bounded memory:
+        the least recently used values are dropped from the hot set, new values are pending
+        till the next flush.
+
+        Parameters
+        ----------
+        connection (sqlite3.Connection):  the database connection.
+        name (str):                       name of the table.
+        hot_size (int):                   count of the recently used values in the memory.
+        on_write (callable):              function without arguments which is called after every new value or None.
+        """
+        self.connection = connection
+        self.name = name
+        self.hot_size = hot_size
+        self.on_write = on_write
+        self.hot = OrderedDict()
+        # values which are not written to the table
+        self.pending = {}
+        # keys which are not in the table by the last lookups, they are cleared by flush
+        self.misses = set()
+        connection.execute('CREATE TABLE IF NOT EXISTS %s (key INTEGER PRIMARY KEY, value INTEGER)' % name)
+        self.count = connection.execute('SELECT COUNT(*) FROM %s' % name).fetchone()[0]
+
+    def __stored(self, key):
+        row = self.connection.execute('SELECT value FROM %s WHERE key = ?' % self.name, (key,)).fetchone()
+        return None if row is None else row[0]
+
+    def __remember(self, key, value):
+        self.hot[key] = value
+        if len(self.hot) > self.hot_size:
+            self.hot.popitem(last = False)
+
+    def get(self, key, default = None):
+        value = self.pending.get(key)
+        if value is not None:
+            return value
+        value = self.hot.pop(key, None)
+        if value is None:
+            value = self.__stored(key)
+            if value is None:
+                self.misses.add(key)
+                return default
+        # the value becomes the most recently used
+        self.__remember(key, value)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in self.pending and key not in self.hot:
+            if key in self.misses:
+                self.misses.discard(key)
+                self.count += 1
+            elif self.__stored(key) is None:
+                self.count += 1
+        self.hot.pop(key, None)
+        self.pending[key] = value
+        if self.on_write is not None:
+            self.on_write()
+
+    def __len__(self):
+        return self.count
+
+    def iteritems(self):
+        """
+        Iteration over all (key, value) pairs, pending values are written before.
+        """
+        self.flush()
+        for item in self.connection.execute('SELECT key, value FROM %s' % self.name):
+            yield item
+
+    def update(self, other):
+        for key, value in other.iteritems():
+            self[key] = value
+
+    def flush(self):
+        """
+        Write pending values to the table (without commit).
+        """
+        if self.pending:
+            self.connection.executemany('INSERT OR REPLACE INTO %s (key, value) VALUES (?, ?)' % self.name,
+                                        self.pending.iteritems())
+            for key, value in self.pending.iteritems():
+                self.__remember(key, value)
+            self.pending = {}
+        self.misses.clear()
+
+
+class SolverCache(DiskDict):
+    def __init__(self, fname, game_board, hot_size = HOT_SIZE,
+                 checkpoint_values = CHECKPOINT_VALUES, checkpoint_seconds = CHECKPOINT_SECONDS):
+        """
+        Persistent cache of position strengths with the dictionary interface (see GameBoard.use_cache),
+        depths of positions are in the 'depths' attribute. The solve writes through the cache:
+        new values are committed by checkpoints, so the solve is resumed from the last checkpoint
+        after a restart, and only the hot set and values since the last checkpoint are in the memory.
+
+        Parameters
+        ----------
+        fname (str):                 path to the SQLite database, it is created if it does not exist.
+        game_board (GameBoard):      a game board which defines the game rules.
+        hot_size (int):              count of the recently used values in the memory.
+        checkpoint_values (int):     count of new values between checkpoints.
+        checkpoint_seconds (float):  maximal time between checkpoints.
+        """
+        if 3**game_board.tmask_width > 2**63:
+            raise TableException('Unique ids of the board %dx%d do not fit SQLite integers.' %
+                                 (game_board.height, game_board.width))
+        self.fname = fname
+        self.checkpoint_values = checkpoint_values
+        self.checkpoint_seconds = checkpoint_seconds
+        self.checkpoints = 0
+        self.written = 0
+        self.checkpoint_time = time()
+        connection = sqlite3.connect(fname, check_same_thread = False)
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        self.__check(connection, game_board)
+        super(SolverCache, self).__init__(connection, 'strengths', hot_size, self.__on_write)
+        self.depths = DiskDict(connection, 'depths', hot_size, self.__on_write)
+        connection.commit()
+
+    def __check(self, connection, game_board):
+        """
+        The cache is made for the game rules.
+        """
+        connection.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+        rules = {'rules' : repr(game_board.table_key()),
+                 'symmetries' : str(symmetries_checksum(game_board.eq_permutations))}
+        for name, value in rules.iteritems():
+            row = connection.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+            if row is None:
+                connection.execute('INSERT INTO meta (name, value) VALUES (?, ?)', (name, value))
+            elif row[0] != value:
+                raise TableException('The cache %s is made for other game rules: %s' % (self.fname, row[0]))
+
+    def __on_write(self):
+        self.written += 1
+        if self.written >= self.checkpoint_values or time() - self.checkpoint_time >= self.checkpoint_seconds:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Commit all pending values and depths.
+        """
+        self.flush()
+        self.depths.flush()
+        self.connection.commit()
+        self.checkpoints += 1
+        self.written = 0
+        self.checkpoint_time = time()
+
+    def close(self):
+        self.checkpoint()
+        self.connection.close()
+
+
+def main():
+    import os
+    from gameboard import GameBoard
+    fname = '3_4_cache.db'
+    gb = GameBoard(3, 4, bitboard = True)
+    cache = gb.use_cache(fname, hot_size = 1000, checkpoint_values = 5000)
+    t = time()
+    gb.position_strength(gb.position)
+    print 'board size 3x4: %d positions, %d checkpoints, time %.2f' % (len(cache), cache.checkpoints, time() - t)
+    cache.close()
+    os.remove(fname)
+
+
+if __name__ == '__main__':
+    main()
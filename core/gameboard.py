@@ -1,7 +1,10 @@
 from os.path import abspath, dirname, exists, join
+from time import time
 
 from bifilter import BinaryFilter
-from utils import enum, memoized_by_uid, add
+from bitboard import BitBoard
+from table import MemoryTable, REGISTRY, save_table, VERSION
+from utils import enum, memoized_by_uid, add, Stats
 
 import pickle
 
@@ -11,6 +14,13 @@ E_LABEL, X_LABEL, O_LABEL = LABELS
 
 STATUS = enum('DRAW', 'WINNING', 'LOSING', 'WINNING_FINAL', 'LOSING_FINAL', 'IMPOSSIBLE', 'UNKNOWN')
 
+# counters of the game tree calculation (see GameBoard.stats):
+#   calls, seconds, max_call_seconds, last_call_seconds - top level position_strength calls,
+#   nodes - calculated positions, memo_hits/memo_misses - memory lookups,
+#   terminals - positions with obvious status, max_depth - maximal depth of the recursion.
+GAMEBOARD_STATS = ['calls', 'seconds', 'max_call_seconds', 'last_call_seconds',
+                   'nodes', 'memo_hits', 'memo_misses', 'terminals', 'max_depth']
+
 
 class GameBoardException(Exception):
     def __init__(self, message):
@@ -18,34 +28,58 @@ class GameBoardException(Exception):
 
 
 class GameBoard(object):
-    def __init__(self, height, width):
+    def __init__(self, height, width, bitboard = False, winning_len = None):
         """
         Game board.
 
         Parameters
         ----------
-        height  (int):   tic tac toe board height.
-        width   (int):   tic tac toe board width.
+        height  (int):       tic tac toe board height.
+        width   (int):       tic tac toe board width.
+        bitboard (bool):     use the bitboard engine for positions and game tree calculation.
+        winning_len (int):   length of winning combinations (k of m,n,k-game), default is min(height, width).
         """
         self.height = height
         self.width = width
+        # length of winning combinations
+        self.winning_len = min(height, width) if winning_len is None else winning_len
+        if not 1 <= self.winning_len <= max(height, width):
+            raise GameBoardException('Winning length %d is not possible for the board %dx%d.' % (self.winning_len, height, width))
         # width of text mask
         self.tmask_width = height * width
         # maximal count of game board states
         self.pos_count = BASE**self.tmask_width
-        # the current position in the text representation
-        self.position = ' ' * self.tmask_width
         # stencils for winning position checking
         self.stencils = self.__make_stencils(height, width)
+        # bitmasks of the stencils which pass through every cell
+        self.cell_stencils = self.__make_cell_stencils()
         # Bitmask of allowed stencils, default is 11111..111 - checking of all stencils make sense
         self.default_stencils_filter = BinaryFilter(len(self.stencils))
         # equivalent game board transformations by using permutations
         self.eq_permutations = self.__equivalent_permutations()
+        # ternary weights of cells for the identity and every equivalent permutation
+        self.symmetry_weights = self.__make_symmetry_weights()
+        # bitboard engine or None for the text representation engine
+        self.bitboard = None
+        if bitboard:
+            self.bitboard = BitBoard(height, width, self.stencils, LABELS, zip(*self.symmetry_weights))
+        # the current position in the text representation
+        self.position = ' ' * self.tmask_width
         # parametrized memoization or dumped strategy
         self.cur_dir = dirname(abspath(__file__))
-
-        dump_path = join(self.cur_dir, join('dump','%d_%d_dump.pkl' % (height, width)))
-        memo_dump = dump_path if exists(dump_path) else None
+        # counters of the game tree calculation, they are not shared with other game boards
+        self.stats = Stats('gameboard', GAMEBOARD_STATS)
+        # current depth of the recursion and the flag of the top level call
+        self.__depth = 0
+        self.__in_call = False
+
+        memo_dump = None
+        # the binary table is preferred to the .pkl dump
+        for extension in ['tbl', 'pkl']:
+            dump_path = join(self.cur_dir, join('dump', self.dump_name(extension)))
+            if exists(dump_path):
+                memo_dump = dump_path
+                break
         self.position_strength = self.memoized(self.position_strength, memo_dump = memo_dump)
 
 
@@ -61,31 +95,44 @@ class GameBoard(object):
         ----------
         (list) list of stencil indicies.
         """
-        winning_len = min(height, width)
-        delta = max(height, width) - winning_len + 1
+        winning_len = self.winning_len
         
-        indexar = []
+        # stencil of winning_len cells from the cell (i, j) in the direction (di, dj)
+        stencil = lambda i, j, di, dj : [(i + di * s) * width + j + dj * s for s in xrange(winning_len)]
+
         rows = []
         for i in xrange(height):
-            indexar.append(range(i * width, (i + 1) * width))
             for shift in xrange(0, width - winning_len + 1):
-                rows.append(range(i * width + shift, i * width + winning_len + shift))
+                rows.append(stencil(i, shift, 0, 1))
 
         cols = []
-        for i in xrange(width):
+        for j in xrange(width):
             for shift in xrange(0, height - winning_len + 1):
-                cols.append(map(lambda x : x[i], indexar[shift:shift + winning_len]))
-
+                cols.append(stencil(shift, j, 1, 0))
 
-        diags = [[] for _ in xrange(2 * delta)]
-        for shift in xrange(delta):
-            for i in xrange(winning_len):
-                shift_i, shift_j = (shift, 0) if height > winning_len else (0, shift)
-                diags[shift * 2].append(indexar[i + shift_i][i + shift_j])
-                diags[shift * 2 + 1].append(indexar[height - shift_i - i - 1][i + shift_j])
+        # main and anti diagonals
+        diags = []
+        for i in xrange(0, height - winning_len + 1):
+            for j in xrange(0, width - winning_len + 1):
+                diags.append(stencil(i, j, 1, 1))
+                diags.append(stencil(height - i - 1, j, -1, 1))
 
         return rows + cols + diags
 
+    def __make_cell_stencils(self):
+        """
+        This method makes the cell to stencils index.
+
+        Returns
+        ----------
+        (list) bitmasks of stencils indicies (see BinaryFilter) for every cell.
+        """
+        cell_stencils = [0] * self.tmask_width
+        for i, stencil in enumerate(self.stencils):
+            for index in stencil:
+                cell_stencils[index] = BinaryFilter.bit_up(cell_stencils[index], i)
+        return cell_stencils
+
     def __equivalent_permutations(self):
         """
         This method makes permutations of equivalent positions (rotation etc..).
@@ -123,15 +170,56 @@ class GameBoard(object):
             permutations.append(reduce(add, mirrored_cols))
 
         return permutations
-            
 
-    def __status(self, position, stencils_filter = None):
+    def __make_symmetry_weights(self):
+        """
+        This method makes ternary weights of cells for every equivalent position.
+        The ternary value of a permuted position is the sum of label indicies multiplied by weights,
+        so unique id can be updated incrementally by moves.
+
+        Returns
+        ----------
+        (list) a list of cell weights for the identity and every permutation.
+        """
+        identity = range(self.tmask_width)
+        symmetry_weights = []
+        for p in [identity] + self.eq_permutations:
+            weights = [0] * self.tmask_width
+            # the cell p[k] becomes k-th ternary digit of the permuted position
+            for k, index in enumerate(p):
+                weights[index] = BASE**(self.tmask_width - k - 1)
+            symmetry_weights.append(weights)
+        return symmetry_weights
+
+    @property
+    def position(self):
+        """
+        (str) the current position in the text representation.
+        """
+        if self.bitboard is not None:
+            return self.bitboard.position
+        return self.__position
+
+    @position.setter
+    def position(self, position):
+        if self.bitboard is not None:
+            self.bitboard.load(position)
+        else:
+            self.__position = position
+        # status of the current position and the stencils filter, see GameBoard.current_status
+        self.__current_status = None
+
+    def __status(self, position, stencils_filter = None, move = None):
         """
         Obvious information about some position by using stencils.
+        If the last move is known only the stencils through the move are checked:
+        stencils_filter must be the filter of the parent position and the parent status must be STATUS.UNKNOWN.
 
         Parameters
         ----------
-        position  (str):   a position in the text representation.
+        position  (str or BitBoard):     a position in the text representation or a bitboard.
+        stencils_filter (BinaryFilter):  allowed stencils.
+        move (int):                      index of the last move or None.
        
         Returns
         ----------
@@ -142,42 +230,52 @@ class GameBoard(object):
 
         # initial value of position strength for current player
         strength_for_current_player = STATUS.UNKNOWN
-        
+
         # Count of first and second players winning combination.
         # This list is used for IMPOSSIBLE positions detection. 
-        wining_count = [0, 0]
+        if isinstance(position, BitBoard):
+            # Stencils checking by integer masks.
+            wining_count, new_stencils_filter = position.scan(stencils_filter, move)
+            player_index = position.player_index()
+        else:
+            wining_count = [0, 0]
 
-        # Current bitmasks are at least like previous bitbasks.
-        new_stencils_filter = BinaryFilter(stencils_filter)
+            # Current bitmasks are at least like previous bitbasks.
+            new_stencils_filter = BinaryFilter(stencils_filter)
 
-        # indicies of labels in LABELS global variable
-        E_IND, X_IND, O_IND = LABELS.index(E_LABEL), LABELS.index(X_LABEL), LABELS.index(O_LABEL)
+            # indicies of labels in LABELS global variable
+            E_IND, X_IND, O_IND = LABELS.index(E_LABEL), LABELS.index(X_LABEL), LABELS.index(O_LABEL)
         
         
-        # indicies of players
-        X_PLAYER, O_PLAYER = 0, 1
-
-        player_label = self.player_label(position)
-        player_index = X_PLAYER if player_label == X_LABEL else O_PLAYER
-
-        for i in stencils_filter.indicies():
-            stencil = self.stencils[i]
-            label_count = [0, 0, 0]
-            # The count of every kind labels calculation for the current stencil.
-            for index in stencil:
-                label_index = LABELS.index(position[index])
-                label_count[label_index] += 1
-
-            if label_count[X_IND] != 0 and label_count[O_IND] != 0:
-                # 'X' and 'O' labels inside this stencil: 
-                # this stencil is not need anymore.
-                new_stencils_filter.drop_index(i)                      
-            elif label_count[X_IND] != 0 and label_count[E_IND] == 0:
-                # if count of an empty labels is zero - X player win.
-                wining_count[X_PLAYER] += 1
-            elif label_count[O_IND] != 0 and label_count[E_IND] == 0:
-                # Similarly.
-                wining_count[O_PLAYER] += 1
+            # indicies of players
+            X_PLAYER, O_PLAYER = 0, 1
+
+            player_label = self.player_label(position)
+            player_index = X_PLAYER if player_label == X_LABEL else O_PLAYER
+
+            checked_filter = BinaryFilter(stencils_filter)
+            if move is not None:
+                # only stencils through the last move can be changed
+                checked_filter.bitmask &= self.cell_stencils[move]
+
+            for i in checked_filter.indicies():
+                stencil = self.stencils[i]
+                label_count = [0, 0, 0]
+                # The count of every kind labels calculation for the current stencil.
+                for index in stencil:
+                    label_index = LABELS.index(position[index])
+                    label_count[label_index] += 1
+
+                if label_count[X_IND] != 0 and label_count[O_IND] != 0:
+                    # 'X' and 'O' labels inside this stencil: 
+                    # this stencil is not need anymore.
+                    new_stencils_filter.drop_index(i)                      
+                elif label_count[X_IND] != 0 and label_count[E_IND] == 0:
+                    # if count of an empty labels is zero - X player win.
+                    wining_count[X_PLAYER] += 1
+                elif label_count[O_IND] != 0 and label_count[E_IND] == 0:
+                    # Similarly.
+                    wining_count[O_PLAYER] += 1
 
         total_winings = sum(wining_count)
         if total_winings == 0:
@@ -224,6 +322,8 @@ class GameBoard(object):
         i, j = I - 1, J - 1
         if 0 <= i < self.height and 0 <= j < self.width:
             index = i * self.width + j
+            if self.bitboard is not None:
+                return self.bitboard.label(index)
             return self.position[index]
         else:
             message = ''
@@ -249,9 +349,18 @@ class GameBoard(object):
         i, j = I - 1, J - 1
         index = i * self.width + j
         if self.label(I, J) == ' ':            
-            
-            player_label = self.player_label(self.position)
-            self.position = self.position[:index] + player_label + self.position[index + 1:]
+            strength, stencils_filter = self.current_status()
+            if self.bitboard is not None:
+                self.bitboard.make_move(index)
+            else:
+                player_label = self.player_label(self.position)
+                self.__position = self.position[:index] + player_label + self.position[index + 1:]
+
+            if strength == STATUS.UNKNOWN:
+                # only stencils through the move can be changed
+                self.__current_status = self.__status(self.bitboard or self.position, stencils_filter, move = index)
+            else:
+                self.__current_status = None
         else:
             m_mask = "Wrong position indicies: the label %s is already in the position (%d, %d)"
             message = m_mask % (self.position[index], I, J)
@@ -260,28 +369,40 @@ class GameBoard(object):
         
     def unique_id(self, position):
         """ 
+        Parameters
+        ----------
+        position  (str or BitBoard):   a position in the text representation or a bitboard.
+
         Returns
         ----------
-        (int) unque id for current postion
+        (int) unque id for current postion: the minimal ternary value of equivalent positions
 
         """
-        ternary = position
-        # replacing ' ', 'X', 'O' by '0','1','2' 
-        for label in LABELS:
-            numeral = str(LABELS.index(label))
-            ternary = ternary.replace(label, numeral)
+        if isinstance(position, BitBoard):
+            # ternary values are updated incrementally by the bitboard moves
+            return min(position.keys)
 
-        # list of equivalent positions in ternary notations
-        equivalent_positions = [ternary]
+        # ' ', 'X', 'O' labels are '0','1','2' ternary digits
+        digits = [(i, LABELS.index(label)) for i, label in enumerate(position) if label != E_LABEL]
+        return min(sum(weights[i] * digit for i, digit in digits) for weights in self.symmetry_weights)
 
-        get_symbol = lambda i : ternary[i]
-        # makes list of equivalent positions by symbols permutation
-        for p in self.eq_permutations:
-            p_pos = reduce(add, map(get_symbol, p))
-            equivalent_positions.append(p_pos)
-        # convert numbers in ternary notation (str) to decimal values (int)
-        ternary_to_decimal = lambda x : int(x, 3)
-        return min(map(ternary_to_decimal, equivalent_positions))
+    def canonical_form(self, position):
+        """
+        Parameters
+        ----------
+        position  (str):   a position in the text representation.
+
+        Returns
+        ----------
+        (int) unique id of the position.
+        (list) permutation of the equivalent position with minimal ternary value:
+               the cell k of the canonical position is the cell permutation[k] of the position.
+        """
+        digits = [(i, LABELS.index(label)) for i, label in enumerate(position) if label != E_LABEL]
+        keys = [sum(weights[i] * digit for i, digit in digits) for weights in self.symmetry_weights]
+        uid = min(keys)
+        index = keys.index(uid)
+        return uid, range(self.tmask_width) if index == 0 else self.eq_permutations[index - 1]
 
     def available_positions(self, position, stencils_filter = None):
         """
@@ -289,24 +410,36 @@ class GameBoard(object):
         Parameters
         ----------
         pos_index  (int):             Position index.
-        prev_stencils_bmasks (list):  A list of available stencils bitmasks for the first and the second player.        
+        stencils_filter (BinaryFilter):  allowed stencils after checking of the current position or None.
         Returns
         ----------
         (dict) available positions - dictionary that collecting lists of masks for strength values. 
         """
-        if stencils_filter is None: stencils_filter = self.default_stencils_filter
+        if stencils_filter is None:
+            # the next positions are checked incrementally by the actual filter of the current position
+            stencils_filter = self.__status(position)[1]
         # Internal representation of current position.
         player_label = self.player_label(position)
 
         # Total count of positions
         positions = dict()
 
+        if self.bitboard is not None:
+            board = self.bitboard.copy()
+            board.load(position)
+            for i in board.empty_indicies():
+                board.make_move(i)
+                this_move_enemy_strength = self.__bitboard_strength(board, stencils_filter, move = i)
+                positions.setdefault(this_move_enemy_strength, []).append(board.position)
+                board.unmake_move(i)
+            return positions
+
         for i, label in enumerate(position):
             if label == ' ':
                 # A mask for the next move.
                 next_position = position[:i] + player_label + position[i + 1:]
                 # Recursion call for the next move.
-                this_move_enemy_strength = self.position_strength(next_position, stencils_filter = stencils_filter)
+                this_move_enemy_strength = self.position_strength(next_position, stencils_filter = stencils_filter, move = i)
                 if this_move_enemy_strength in positions:
                     positions[this_move_enemy_strength].append(next_position)
                 else:
@@ -319,7 +452,7 @@ class GameBoard(object):
 
 
 
-    def position_strength(self, position, stencils_filter = None):
+    def position_strength(self, position, stencils_filter = None, move = None):
         """
         Position strength for the player which moved from current position.
 
@@ -327,6 +460,7 @@ class GameBoard(object):
         ----------
         pos_index  (int):                Position index.
         stencils_filter (BinaryFilter):  A list of available stencils bitmasks for the first and the second player.        
+        move (int):                      index of the last move, stencils_filter is the filter of the parent position then.
 
         Returns
         ----------
@@ -335,35 +469,269 @@ class GameBoard(object):
         # setting default value for both stencils
 
         if stencils_filter is None: stencils_filter = self.default_stencils_filter
-        strength, actual_filter = self.__status(position, stencils_filter = stencils_filter)
+        if self.bitboard is not None:
+            board = self.bitboard.copy()
+            board.load(position)
+            return self.__bitboard_strength(board, stencils_filter, move = move)
+
+        strength, actual_filter = self.__status(position, stencils_filter = stencils_filter, move = move)
+        self.__count_node(strength)
         
         if strength != STATUS.UNKNOWN:
             return strength
         else:
             # Otherwise we must to check all available positions.
-            available_positions = self.available_positions(position, stencils_filter = stencils_filter)
+            self.__enter()
+            try:
+                available_positions = self.available_positions(position, stencils_filter = actual_filter)
+            finally:
+                self.__depth -= 1
+            return self.__strength_by_moves(available_positions)
+
+    def position_depth(self, position):
+        """
+        Count of moves till the end of the game by the best play: the winning player
+        wants the fastest win, the losing player wants the longest resistance.
+        Depths are calculated by strengths of positions and memoized in self.depths.
 
-            def count_of(strength_value):
-                if strength_value in available_positions:
-                    return len(available_positions[strength_value])
-                else:
-                    return 0
-
-            strength = STATUS.UNKNOWN
-            if count_of(STATUS.LOSING) > 0 or count_of(STATUS.LOSING_FINAL) > 0:
-                # If there are some moves to the enemy losing, this position is winning.
-                strength = STATUS.WINNING
-            elif count_of(STATUS.WINNING) > 0 or count_of(STATUS.WINNING_FINAL) > 0:
-                # Otherwise the enemy can winning if there is no moves to draw.
-                if count_of(STATUS.DRAW) == 0:
-                    strength = STATUS.LOSING
-                else:
-                    strength = STATUS.DRAW
+        Parameters
+        ----------
+        position  (str):   a position in the text representation.
+
+        Returns
+        ----------
+        (int) count of moves, 0 for final and draw positions.
+        """
+        uid = self.unique_id(position)
+        depth = self.depths.get(uid)
+        if depth is not None:
+            return depth
+
+        strength = self.position_strength(position)
+        depth = 0
+        if strength in [STATUS.WINNING, STATUS.LOSING]:
+            player_label = self.player_label(position)
+            enemy_depths = []
+            for i, label in enumerate(position):
+                if label == E_LABEL:
+                    next_position = position[:i] + player_label + position[i + 1:]
+                    enemy_strength = self.position_strength(next_position)
+                    # the winning player moves to the enemy losing positions only
+                    if strength == STATUS.WINNING and enemy_strength not in [STATUS.LOSING, STATUS.LOSING_FINAL]:
+                        continue
+                    enemy_depths.append(self.position_depth(next_position))
+            depth = 1 + (min(enemy_depths) if strength == STATUS.WINNING else max(enemy_depths))
+        self.depths[uid] = depth
+        return depth
+
+    def fill_depths(self):
+        """
+        Calculate depths of all positions of the game tree (see position_depth).
+        """
+        for position, _, _, _ in self.iter_positions(by_depth = False):
+            self.position_depth(position)
+
+    def __symmetry_group(self):
+        """
+        Equivalent permutations are not closed under composition (there are no transpositions),
+        the group is the closure of them.
+
+        Returns
+        ----------
+        (list) permutations of the group including the identity.
+        """
+        identity = tuple(xrange(self.tmask_width))
+        group = set([identity] + [tuple(p) for p in self.eq_permutations])
+        while True:
+            products = set(tuple(p[k] for k in q) for p in group for q in group)
+            if products <= group:
+                return sorted(group)
+            group |= products
+
+    def iter_positions(self, canonical = True, by_depth = True):
+        """
+        Generator of all reachable positions, every position is yielded once.
+        Positions are expanded by orbits of the symmetry group: one position of every orbit.
+
+        Parameters
+        ----------
+        canonical (bool):  one position of every unique id (see unique_id) or all positions.
+        by_depth (bool):   breadth first order: positions are yielded by depths and
+                           only the current and the next levels are kept in memory,
+                           depth first order otherwise (all visited orbits are kept in memory).
+
+        Yields
+        ----------
+        (str) a position in the text representation.
+        (int) depth of the position: count of moves from the empty board.
+        (int) obvious status of the position (see position_status), STATUS.UNKNOWN for not terminal positions.
+        (int) count of positions with the same unique id (1 if canonical is False).
+        """
+        group = self.__symmetry_group()
+        # ternary weights of cells for the minimal value of the orbit (see __make_symmetry_weights)
+        group_weights = []
+        for p in group:
+            weights = [0] * self.tmask_width
+            for k, index in enumerate(p):
+                weights[index] = BASE**(self.tmask_width - k - 1)
+            group_weights.append(weights)
+
+        def orbit_key(position):
+            digits = [(i, LABELS.index(label)) for i, label in enumerate(position) if label != E_LABEL]
+            return min(sum(weights[i] * digit for i, digit in digits) for weights in group_weights)
+
+        def expand(position, depth, children):
+            # positions of the orbit are yielded, children are appended to the list
+            images = set(''.join(position[index] for index in p) for p in group)
+            status = self.position_status(position)
+            if canonical:
+                classes = {}
+                for image in images:
+                    classes.setdefault(self.unique_id(image), []).append(image)
+                for uid in sorted(classes):
+                    yield min(classes[uid]), depth, status, len(classes[uid])
+            else:
+                for image in sorted(images):
+                    yield image, depth, status, 1
+            if status == STATUS.UNKNOWN and E_LABEL in position:
+                player_label = self.player_label(position)
+                for i, label in enumerate(position):
+                    if label == E_LABEL:
+                        next_position = position[:i] + player_label + position[i + 1:]
+                        children.append((orbit_key(next_position), next_position))
+
+        root = ' ' * self.tmask_width
+        if by_depth:
+            level = {0 : root}
+            depth = 0
+            while level:
+                next_level = {}
+                for key in sorted(level):
+                    children = []
+                    for item in expand(level[key], depth, children):
+                        yield item
+                    for child_key, child in children:
+                        next_level.setdefault(child_key, child)
+                level = next_level
+                depth += 1
+        else:
+            stack = [(root, 0)]
+            visited = set([0])
+            while stack:
+                position, depth = stack.pop()
+                children = []
+                for item in expand(position, depth, children):
+                    yield item
+                for child_key, child in reversed(children):
+                    if child_key not in visited:
+                        visited.add(child_key)
+                        stack.append((child, depth + 1))
+
+    def evaluate_many(self, positions):
+        """
+        Batch evaluation of positions: stencils checking and unique ids are calculated
+        for all positions at once by NumPy, strengths are read from the solved table
+        (missing positions are solved by position_strength).
+
+        Parameters
+        ----------
+        positions (iterable or np.array):  positions in the text representation
+                                           or array of label indicies with shape (count, height * width).
+
+        Returns
+        ----------
+        (np.array) position strengths for the current players.
+        (np.array) game over flags.
+        (np.array) indicies of the best moves, -1 for finished games.
+        """
+        # NumPy is required for the batch evaluation only
+        from batch import evaluate_many
+        return evaluate_many(self, positions)
+
+    def __bitboard_strength(self, board, stencils_filter, move = None):
+        """
+        Position strength calculation by the bitboard engine.
+        The board is changed by make/unmake moves and restored before returning.
+
+        Parameters
+        ----------
+        board (BitBoard):                current position.
+        stencils_filter (BinaryFilter):  allowed stencils for the parent position.
+        move (int):                      index of the last move or None for checking of all allowed stencils.
+
+        Returns
+        ----------
+        (int) position strength for current player.
+        """
+        uid = self.unique_id(board)
+        if uid in self.memory:
+            self.stats.memo_hits += 1
+            return self.memory[uid]
+        self.stats.memo_misses += 1
+
+        strength, actual_filter = self.__status(board, stencils_filter = stencils_filter, move = move)
+        self.__count_node(strength)
+        if strength == STATUS.UNKNOWN:
+            enemy_strengths = set()
+            self.__enter()
+            try:
+                for i in board.empty_indicies():
+                    board.make_move(i)
+                    enemy_strengths.add(self.__bitboard_strength(board, actual_filter, move = i))
+                    board.unmake_move(i)
+            finally:
+                self.__depth -= 1
+            strength = self.__strength_by_moves(enemy_strengths)
+
+        self.memory[uid] = strength
+        return strength
+
+    def __count_node(self, strength):
+        """
+        Count the calculated position and emit stats periodically.
+        """
+        stats = self.stats
+        stats.nodes += 1
+        if strength != STATUS.UNKNOWN:
+            stats.terminals += 1
+        if stats.emitter is not None:
+            stats.tick(stats.nodes, memory = len(self.memory))
+
+    def __enter(self):
+        """
+        Go one level deeper into the game tree.
+        """
+        self.__depth += 1
+        if self.__depth > self.stats.max_depth:
+            self.stats.max_depth = self.__depth
+
+    def __strength_by_moves(self, enemy_strengths):
+        """
+        Position strength by strengths of the available positions.
+
+        Parameters
+        ----------
+        enemy_strengths (dict or set):  strengths of the available positions for the enemy.
+
+        Returns
+        ----------
+        (int) position strength for current player.
+        """
+        strength = STATUS.UNKNOWN
+        if STATUS.LOSING in enemy_strengths or STATUS.LOSING_FINAL in enemy_strengths:
+            # If there are some moves to the enemy losing, this position is winning.
+            strength = STATUS.WINNING
+        elif STATUS.WINNING in enemy_strengths or STATUS.WINNING_FINAL in enemy_strengths:
+            # Otherwise the enemy can winning if there is no moves to draw.
+            if STATUS.DRAW not in enemy_strengths:
+                strength = STATUS.LOSING
             else:
-                # If there are no moves to winning someone - draw
                 strength = STATUS.DRAW
+        else:
+            # If there are no moves to winning someone - draw
+            strength = STATUS.DRAW
 
-            return strength
+        return strength
 
     def memoized(self, func, memo_dump=None):
         """
@@ -371,46 +739,143 @@ class GameBoard(object):
         Parameters
         ----------
         func  (callable): class method.
-        memo_dump (str) : path to memory dump (dictionary in .pkl file format) or None.
+        memo_dump (str) : path to memory dump (.tbl table or dictionary in .pkl file format) or None.
 
         Returns
         ----------
         wrapped function 'func' 
         """        
-        self.memory = {} if memo_dump is None else self.load_memory_dump(memo_dump)
-        def wrapped(*args, **kwargs):
+        # the memory is shared by all game boards with the same rules (see table.REGISTRY)
+        load = lambda : {} if memo_dump is None else self.load_memory_dump(memo_dump)
+        self.memory = REGISTRY.get(self.table_key(), load)
+        # depths of positions are stored with strengths in tables since version 2
+        self.depths = REGISTRY.get(self.table_key() + ('depths',), lambda : getattr(self.memory, 'depths', {}))
+        def lookup(*args, **kwargs):
             uid = self.unique_id(args[0])
             if uid in self.memory:
+                self.stats.memo_hits += 1
                 return self.memory[uid]
             else:
+                # the bitboard engine counts the miss itself (see __bitboard_strength)
+                if self.bitboard is None:
+                    self.stats.memo_misses += 1
                 value = func(*args, **kwargs)
                 self.memory[uid] = value
                 return value
 
+        def wrapped(*args, **kwargs):
+            if self.__in_call:
+                return lookup(*args, **kwargs)
+            # the top level call is timed
+            stats = self.stats
+            self.__in_call = True
+            t = time()
+            try:
+                return lookup(*args, **kwargs)
+            finally:
+                self.__in_call = False
+                elapsed = time() - t
+                stats.calls += 1
+                stats.seconds += elapsed
+                stats.last_call_seconds = elapsed
+                stats.max_call_seconds = max(stats.max_call_seconds, elapsed)
+
         return wrapped
 
-    def save_memory_dump(self, fname):
+    def dump_name(self, extension):
         """
-        Save dictionary to .pkl file.
+        Returns
+        ----------
+        (str) file name of the memory dump, the winning length is in the name if it is not default.
+        """
+        if self.winning_len == min(self.height, self.width):
+            return '%d_%d_dump.%s' % (self.height, self.width, extension)
+        return '%d_%d_%d_dump.%s' % (self.height, self.width, self.winning_len, extension)
+
+    def table_key(self):
+        """
+        Returns
+        ----------
+        (tuple) key of the solved table in the registry: board size and game rules.
+        """
+        return (self.height, self.width, self.winning_len)
+
+    def save_memory_dump(self, fname, memory = None, depths = None, version = VERSION, solver = None, flags = 0):
+        """
+        Save dictionary to .tbl table (see table module) or .pkl file.
         
         Parameters
         ----------
         fname (str) path to output file.
+        memory (dict) position strengths by unique ids, default is self.memory.
+        depths (dict) position depths by unique ids for .tbl table, default is self.depths.
+        version (int) .tbl table version, by default entries of positions of the table are indexed by dense ranks.
+        solver (str) name of the solver of the table for .tbl table or None.
+        flags (int) completeness flags of the table for .tbl table (see table.COMPLETE).
         """
-        with open(fname, 'wb') as f:
-            pickle.dump(self.memory, f, pickle.HIGHEST_PROTOCOL)
+        if memory is None: memory = self.memory
+        if depths is None: depths = self.depths
+        if fname.endswith('.tbl'):
+            save_table(fname, memory, self.height, self.width, self.eq_permutations, depths, version, self.winning_len,
+                       solver, flags)
+        else:
+            with open(fname, 'wb') as f:
+                pickle.dump(dict(memory.iteritems()), f, pickle.HIGHEST_PROTOCOL)
 
     def load_memory_dump(self, fname):
         """
-        Load dictionary from .pkl file.
+        Load dictionary from .tbl table or .pkl file.
+        The table is memory-mapped: positions are read from the file on demand.
         
         Parameters
         ----------
         fname (str) path to input file.
         """
+        if fname.endswith('.tbl'):
+            table = MemoryTable(fname)
+            table.check(self.height, self.width, self.eq_permutations, self.winning_len)
+            return table
         with open(fname, 'rb') as f:
             return pickle.load(f)
 
+    def convert_memory_dump(self, src, dst, version = VERSION):
+        """
+        Convert memory dump between .pkl and .tbl formats or versions of .tbl tables.
+
+        Parameters
+        ----------
+        src (str) path to input file.
+        dst (str) path to output file.
+        version (int) .tbl table version (see table module).
+        """
+        memory = self.load_memory_dump(src)
+        self.save_memory_dump(dst, memory, getattr(memory, 'depths', {}), version,
+                              getattr(memory, 'solver', None), getattr(memory, 'flags', None) or 0)
+
+    def use_cache(self, fname, **options):
+        """
+        Solve through the persistent cache (see cache.SolverCache): solved positions are
+        written to the disk by checkpoints, so the solve is resumed after a restart.
+        The cache is shared by all game boards with the same rules (see table.REGISTRY).
+
+        Parameters
+        ----------
+        fname (str) path to the cache database.
+        options (dict) keyword arguments of SolverCache (hot_size, checkpoint_values, checkpoint_seconds).
+
+        Returns
+        ----------
+        (SolverCache) the cache, it must be closed (or checkpointed) after the solve.
+        """
+        from cache import SolverCache
+        cache = SolverCache(fname, self, **options)
+        key = self.table_key()
+        for table_key, table in [(key, cache), (key + ('depths',), cache.depths)]:
+            REGISTRY.evict(table_key)
+            REGISTRY.get(table_key, lambda table = table : table)
+        self.memory, self.depths = cache, cache.depths
+        return cache
+
     def winning_indicies(self):
         """
         The function generates a list of winning indicies 
@@ -455,7 +920,7 @@ class GameBoard(object):
         -----------
         (str) text description of current position
         """
-        status = self.__status(self.position)
+        status = self.current_status()
         player_label = self.player_label(self.position)
         enemy_label = 'X' if player_label == 'O' else 'O'
 
@@ -468,6 +933,32 @@ class GameBoard(object):
         else:
             return 'Game...'
 
+    def position_status(self, position):
+        """
+        Obvious status of some position by using stencils.
+
+        Parameters
+        ----------
+        position  (str):   a position in the text representation.
+
+        Returns
+        -----------
+        (int) strength for the current player, STATUS.UNKNOWN if the game tree must be checked.
+        """
+        return self.__status(position)[0]
+
+    def current_status(self):
+        """
+        The status of the current game board position, it is updated incrementally by moves.
+        Returns
+        -----------
+        (int) strength for the current player
+        (BinaryFilter) allowed stencils after checking
+        """
+        if self.__current_status is None:
+            self.__current_status = self.__status(self.bitboard or self.position)
+        return self.__current_status
+
     def game_over(self):
         """
         Game over checking.
@@ -478,25 +969,14 @@ class GameBoard(object):
         if self.position.count(' ') == 0:
             return True
         else:
-            status = self.__status(self.position)
+            status = self.current_status()
             return status[0] in [STATUS.LOSING_FINAL, STATUS.WINNING_FINAL]
 
-def main():
-    for w, h in [(3,3), (3, 4), (4, 3)]:
-        gb = GameBoard(h, w)
-        print 'Game tree calculation for board size', h, w
-        print 'It may takes a several minutes... Please wait.'
-	
-        from time import time
-        t = time()
-        gb.position_strength(gb.position)
-        time() - t
-        path_to_dump = join(gb.cur_dir, 'dump')
-        if not exists(path_to_dump):
-            from os import mkdir
-            mkdir(path_to_dump)
-        print 'dump to %s' % path_to_dump
-        gb.save_memory_dump(join(path_to_dump, '%d_%d_dump.pkl' % (gb.height, gb.width)))
- 
+def main(solver = 'full', jobs = 1, cache_dir = None):
+    # tables and books of the default board sizes are built by the build module (see dump_gametree.py)
+    from build import build, format_totals
+    print 'Game tree calculation, it may takes a several minutes... Please wait.'
+    print format_totals(build(solver = solver, jobs = jobs, cache_dir = cache_dir, force = True))
+
 if __name__=='__main__':
     main()
@@ -0,0 +1,327 @@
+# external imports:
+import random
+from math import log, sqrt
+from multiprocessing import Pool
+from time import time
+
+# internal imports:
+from bitboard import BitBoard
+from gameboard import GameBoard, LABELS
+from threats import bit_indicies
+
+
+# count of playouts of one search by default
+PLAYOUTS = 2000
+# exploration constant of UCT
+EXPLORATION = 1.4
+# the time budget is checked once per this count of playouts
+TIME_CHECK_PERIOD = 32
+
+
+class Node(object):
+    __slots__ = ['children', 'untried', 'visits', 'value', 'result']
+
+    def __init__(self, untried, result = None):
+        """
+        Node of the search tree.
+
+        Parameters
+        ----------
+        untried (list):   cells of moves which are not expanded.
+        result (float):   the result of the finished game for the player which moved into the node
+                          (1 is a win, 0.5 is a draw) or None.
+        """
+        # child nodes by cells of moves
+        self.children = {}
+        self.untried = untried
+        self.visits = 0
+        # sum of results for the player which moved into the node
+        self.value = 0.0
+        self.result = result
+
+
+class MCTS(object):
+    def __init__(self, game_board, playouts = PLAYOUTS, budget_ms = None, exploration = EXPLORATION,
+                 processes = 1, seed = None):
+        """
+        Monte Carlo tree search (UCT) for boards which are too large to solve.
+        Positions are bitmasks of the players, finished games are checked by stencils of the game board
+        through the last move. The tree is kept between moves: the next search starts from the subtree
+        of the new position. Root-parallel search: processes - 1 worker processes search their own trees,
+        visits of root moves are summed.
+
+        Parameters
+        ----------
+        game_board (GameBoard): a game board which defines the game rules.
+        playouts (int):         count of playouts of one search (per process) or None.
+        budget_ms (int):        time budget of one search in milliseconds or None.
+        exploration (float):    exploration constant of UCT.
+        processes (int):        count of processes of root-parallel search.
+        seed (int):             random seed or None.
+        """
+        if playouts is None and budget_ms is None:
+            playouts = PLAYOUTS
+        self.game_board = game_board
+        self.size = game_board.tmask_width
+        self.full = (1 << self.size) - 1
+        # ternary keys are not needed for the search: one zero weight per cell
+        self.board = BitBoard(game_board.height, game_board.width, game_board.stencils,
+                              LABELS, [(0,)] * self.size)
+        # stencil masks through every cell for checking of the last move
+        stencil_masks = self.board.stencil_masks
+        self.cell_masks = [[stencil_masks[s] for s in bit_indicies(game_board.cell_stencils[i])]
+                           for i in xrange(self.size)]
+        self.playouts = playouts
+        self.budget_ms = budget_ms
+        self.exploration = exploration
+        self.processes = processes
+        self.random = random.Random(seed)
+        # count of playouts of all searches
+        self.nodes = 0
+        # the tree of the last search and its position
+        self.root = None
+        self.root_position = None
+        self.pool = None
+        # event which stops the search in this process (see AI.ponder) or None
+        self.stop = None
+
+    def __wins(self, own, move):
+        for mask in self.cell_masks[move]:
+            if own & mask == mask:
+                return True
+        return False
+
+    def __new_node(self, own, enemy, move):
+        """
+        Returns
+        ----------
+        (Node) the node after the move of the player with own labels (the move is in own).
+        """
+        if self.__wins(own, move):
+            return Node([], 1.0)
+        empty = self.full & ~(own | enemy)
+        if not empty:
+            return Node([], 0.5)
+        return Node(bit_indicies(empty))
+
+    def __playout(self, own, enemy):
+        """
+        Random game from the position.
+
+        Parameters
+        ----------
+        own   (int):     bitmask of labels of the player which moves.
+        enemy (int):     bitmask of labels of the player which moved.
+
+        Returns
+        ----------
+        (float) the result for the player which moved.
+        """
+        cells = bit_indicies(self.full & ~(own | enemy))
+        self.random.shuffle(cells)
+        # the result for the player which moves now is inverted by every move
+        result = 0.0
+        for move in cells:
+            own |= 1 << move
+            if self.__wins(own, move):
+                return result
+            own, enemy = enemy, own
+            result = 1.0 - result
+        return 0.5
+
+    def __iterate(self, root, own, enemy):
+        """
+        One playout: selection by UCT, expansion of one node, random game and backpropagation.
+        """
+        node = root
+        path = [node]
+        while node.result is None and not node.untried:
+            log_visits = log(node.visits)
+            exploration = self.exploration
+            best_score = -1.0
+            for move, child in node.children.iteritems():
+                score = child.value / child.visits + exploration * sqrt(log_visits / child.visits)
+                if score > best_score:
+                    best_score, best_move, best_child = score, move, child
+            own, enemy = enemy, own | (1 << best_move)
+            node = best_child
+            path.append(node)
+
+        if node.result is None:
+            untried = node.untried
+            move = untried.pop(self.random.randint(0, len(untried) - 1))
+            new_own = own | (1 << move)
+            child = self.__new_node(new_own, enemy, move)
+            node.children[move] = child
+            own, enemy = enemy, new_own
+            node = child
+            path.append(node)
+
+        result = node.result if node.result is not None else self.__playout(own, enemy)
+        for node in reversed(path):
+            node.visits += 1
+            node.value += result
+            result = 1.0 - result
+        self.nodes += 1
+
+    def __masks(self, position):
+        """
+        Returns
+        ----------
+        (int) bitmask of labels of the player which moves.
+        (int) bitmask of labels of the enemy.
+        """
+        board = self.board
+        board.load(position)
+        # validation only: GameBoardException is raised for impossible counts of labels
+        self.game_board.player_label(position)
+        if board.player_index() == 0:
+            return board.x_mask, board.o_mask
+        return board.o_mask, board.x_mask
+
+    def __reuse(self, position):
+        """
+        Returns
+        ----------
+        (Node) the subtree of the last search for the position or None.
+        """
+        node, root_position = self.root, self.root_position
+        if node is None or len(root_position) != len(position):
+            return None
+        moves = [i for i in xrange(len(position)) if root_position[i] != position[i]]
+        if any(root_position[i] != ' ' for i in moves):
+            return None
+        label = self.game_board.player_label(root_position)
+        while moves:
+            # the moves of both players are made alternately from the root position
+            cells = [i for i in moves if position[i] == label and i in node.children]
+            if not cells:
+                return None
+            node = node.children[cells[0]]
+            moves.remove(cells[0])
+            label = LABELS[3 - LABELS.index(label)]
+        return node
+
+    def root_stats(self, position, playouts = None, budget_ms = None):
+        """
+        Search from the position in this process.
+
+        Parameters
+        ----------
+        position (str):    a position in the text representation.
+        playouts (int):    count of playouts or None.
+        budget_ms (int):   time budget in milliseconds or None.
+
+        Returns
+        ----------
+        (dict) visits and sums of results of root moves by cells.
+        """
+        own, enemy = self.__masks(position)
+        root = self.__reuse(position)
+        if root is None:
+            root = Node(bit_indicies(self.full & ~(own | enemy)))
+        self.root, self.root_position = root, position
+
+        deadline = None if budget_ms is None else time() + budget_ms / 1000.0
+        stop = self.stop
+        count = 0
+        while playouts is None or count < playouts:
+            self.__iterate(root, own, enemy)
+            count += 1
+            if count % TIME_CHECK_PERIOD == 0:
+                if deadline is not None and time() >= deadline:
+                    break
+                if stop is not None and stop.is_set():
+                    break
+        return dict((move, (child.visits, child.value)) for move, child in root.children.iteritems())
+
+    def search(self, position):
+        """
+        Root-parallel search from the position.
+
+        Returns
+        ----------
+        (dict) visits and sums of results of root moves by cells (summed by processes).
+        """
+        results = None
+        if self.processes > 1:
+            if self.pool is None:
+                self.pool = Pool(self.processes - 1)
+            gb = self.game_board
+            tasks = [(gb.height, gb.width, gb.winning_len, position, self.playouts, self.budget_ms,
+                      self.exploration, self.random.randint(0, 2**31)) for _ in xrange(self.processes - 1)]
+            results = self.pool.map_async(search_worker, tasks)
+        # the main process searches too
+        stats = self.root_stats(position, self.playouts, self.budget_ms)
+        if results is not None:
+            for worker_stats in results.get():
+                for move, (visits, value) in worker_stats.iteritems():
+                    stats_visits, stats_value = stats.get(move, (0, 0.0))
+                    stats[move] = (stats_visits + visits, stats_value + value)
+                    # playouts of workers are counted too
+                    self.nodes += visits
+        return stats
+
+    def best_move(self, position):
+        """
+        Parameters
+        ----------
+        position (str): a position in the text representation.
+
+        Returns
+        ----------
+        (int) index of the cell of the most visited root move.
+        """
+        stats = self.search(position)
+        return max(stats, key = lambda move : (stats[move][0], stats[move][1]))
+
+    def close(self):
+        """
+        Stop worker processes.
+        """
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+
+# search engines of worker processes by game rules, their trees are reused between moves
+_worker_engines = {}
+
+def search_worker(task):
+    """
+    Worker process function of root-parallel search (see MCTS.search).
+
+    Parameters
+    ----------
+    task (tuple): height, width, winning length, position, playouts, time budget, exploration constant and seed.
+
+    Returns
+    ----------
+    (dict) visits and sums of results of root moves by cells.
+    """
+    height, width, winning_len, position, playouts, budget_ms, exploration, seed = task
+    key = (height, width, winning_len)
+    engine = _worker_engines.get(key)
+    if engine is None:
+        engine = MCTS(GameBoard(height, width, winning_len = winning_len), exploration = exploration)
+        _worker_engines[key] = engine
+    engine.random.seed(seed)
+    return engine.root_stats(position, playouts, budget_ms)
+
+
+def main():
+    for h, w, k in [(7, 7, 4), (9, 9, 5)]:
+        gb = GameBoard(h, w, winning_len = k)
+        engine = MCTS(gb, playouts = 1000)
+        t = time()
+        moves = 0
+        while not gb.game_over():
+            i = engine.best_move(gb.position)
+            gb.update_position(i / w + 1, i % w + 1)
+            moves += 1
+        print '%dx%d k=%d: %s after %d moves, %.3f s per move, %d playouts' % (
+            h, w, k, gb.status(), moves, (time() - t) / moves, engine.nodes)
+
+
+if __name__ == '__main__':
+    main()
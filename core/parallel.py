@@ -0,0 +1,117 @@
+# external imports:
+from multiprocessing import Pool, cpu_count
+
+# internal imports:
+from gameboard import GameBoard, STATUS
+
+
+def split_positions(game_board, plies):
+    """
+    Positions after the first plies of the game without equivalent (symmetric) positions.
+    The game tree is split by these positions between worker processes.
+
+    Parameters
+    ----------
+    game_board (GameBoard):  a game board which defines the game rules.
+    plies (int):             count of the first moves.
+
+    Returns
+    ----------
+    (list) positions in the text representation, final positions are not included.
+    """
+    level = [game_board.position]
+    for _ in xrange(plies):
+        next_level = {}
+        for position in level:
+            player_label = game_board.player_label(position)
+            for i, label in enumerate(position):
+                if label == ' ':
+                    next_position = position[:i] + player_label + position[i + 1:]
+                    uid = game_board.unique_id(next_position)
+                    if uid not in next_level and game_board.position_status(next_position) == STATUS.UNKNOWN:
+                        next_level[uid] = next_position
+        level = next_level.values()
+    return level
+
+
+def solve_subtrees(task):
+    """
+    Worker process function: solve game trees from some positions with one memory.
+
+    Parameters
+    ----------
+    task (tuple): height, width, winning length and list of positions in the text representation.
+
+    Returns
+    ----------
+    (tuple) height, width, winning length, memory of the solved positions (dict) and count of calculated positions.
+    """
+    height, width, winning_len, positions = task
+    gb = GameBoard(height, width, bitboard = True, winning_len = winning_len)
+    # subtrees are solved from scratch
+    gb.memory = {}
+    for position in positions:
+        gb.position_strength(position)
+    return height, width, winning_len, gb.memory, gb.stats.nodes
+
+
+def solve_tables(sizes, plies = 2, processes = None):
+    """
+    Parallel game tree calculation for several board sizes.
+    The trees are split at the first plies and subtrees are solved by a pool of processes,
+    then memories of subtrees are merged and the first plies are solved by the merged memory.
+    Board sizes are solved concurrently by the same pool.
+
+    Parameters
+    ----------
+    sizes (list):      list of (height, width, winning length or None for the default).
+    plies (int):       count of the first moves for splitting.
+    processes (int):   count of worker processes, default is count of CPU.
+
+    Returns
+    ----------
+    (dict) solved memories by sizes.
+    (dict) counts of calculated positions by sizes.
+    """
+    if processes is None: processes = cpu_count()
+    # subtrees of every board size are divided into chunks by count of processes,
+    # positions of one chunk share the memory of a worker
+    tasks = []
+    for height, width, winning_len in sizes:
+        gb = GameBoard(height, width, bitboard = True, winning_len = winning_len)
+        positions = split_positions(gb, plies)
+        chunks_count = min(processes, len(positions))
+        tasks.extend((height, width, winning_len, positions[i::chunks_count]) for i in xrange(chunks_count))
+
+    memories = dict((size, {}) for size in sizes)
+    nodes = dict((size, 0) for size in sizes)
+    pool = Pool(processes)
+    try:
+        for height, width, winning_len, memory, task_nodes in pool.imap_unordered(solve_subtrees, tasks):
+            memories[(height, width, winning_len)].update(memory)
+            nodes[(height, width, winning_len)] += task_nodes
+    finally:
+        pool.close()
+        pool.join()
+
+    for size in sizes:
+        height, width, winning_len = size
+        gb = GameBoard(height, width, bitboard = True, winning_len = winning_len)
+        gb.memory = memories[size]
+        gb.position_strength(gb.position)
+        nodes[size] += gb.stats.nodes
+    return memories, nodes
+
+
+def main():
+    from time import time
+    sizes = [(3, 3, None), (4, 3, None), (3, 4, None)]
+    t = time()
+    memories, nodes = solve_tables(sizes)
+    for size in sizes:
+        print 'board size %dx%d: %d positions, %d nodes' % (size[:2] + (len(memories[size]), nodes[size]))
+    print 'time %.2f' % (time() - t)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,33 @@
 # external imports:
+from collections import OrderedDict
 from random import randint
+from threading import Event, Thread
+from time import time
 
 # internal imports:
-from utils import die, enum, count_of
+from utils import die, enum, Stats
 from gameboard import GameBoard, GameBoardException, STATUS
+from solver import make_solver, SearchTimeout, OPTIONAL_SOLVERS
+from book import load_book, best_moves
+from threats import ThreatSearch
+from mcts import MCTS
 
 
-MAX_SEARCHING_DEPTH = 5
+# counters of AI moves (see AI.stats): nodes are calculated positions of the game board and searched nodes of solvers
+AI_STATS = ['moves', 'seconds', 'max_move_seconds', 'last_move_seconds', 'nodes', 'last_move_nodes', 'ponder_hits']
+# solver engines of AI (see AI)
+AI_SOLVERS = ['full', 'negamax', 'threats', 'mcts']
+# count of pondered replies in the cache of AI (the least recently used replies are dropped)
+PONDER_CACHE_SIZE = 4096
 
 class PlayerException(Exception):
     def __init__(self, message):
         super(PlayerException, self).__init__(message)
 
 class Player(object):
+    # moves of automatic players are calculated by next_move, moves of other players are the user input
+    automatic = False
+
     def __init__(self, interface_callback = None):
         """
         Player construction.
@@ -35,7 +50,20 @@ class Player(object):
                 print('Wrong format, two integer values needed.')
         
 
-        
+    def next_move(self, game_board):
+        """
+        The move of the current player, the game board is not changed.
+
+        Parameters
+        ----------
+        game_board (GameBoard): current state of game board.
+
+        Returns
+        ----------
+        (int, int) coordinates of move (the first value from 1 to board.height, the second value from 1 to board.width)
+        """
+        return self.__next_position(game_board)
+
     def move(self, game_board):
         """
         Changes game board by making the current player move.
@@ -46,17 +74,124 @@ class Player(object):
         """
         while True:
             try:
-                i, j = self.__next_position(game_board)
+                i, j = self.next_move(game_board)
                 game_board.update_position(i, j)
                 break
             except GameBoardException as GBE:
                 print(GBE.message)
+
+    def close(self):
+        """
+        Release resources of the player (background threads, worker processes),
+        the player can be used for the next game.
+        """
+        pass
         
 
-class AI(Player):
+class RandomPlayer(Player):
+    automatic = True
+
     def __init__(self):
+        """
+        The player which moves into a random empty cell.
+        """
+        super(RandomPlayer, self).__init__(self.__random_move)
+
+    def __random_move(self, game_board):
+        """
+        Returns
+        ---------
+        (int, int) coordinates of a random empty cell.
+        """
+        empty_indexes = [i for i, label in enumerate(game_board.position) if label == ' ']
+        i = empty_indexes[randint(0, len(empty_indexes) - 1)]
+        return i / game_board.width + 1, i % game_board.width + 1
+
+
+class AI(Player):
+    automatic = True
+
+    def __init__(self, solver = 'full', budget_ms = None, max_nodes = None, ponder = False, processes = 1,
+                 stop = None):
+        """
+        AI player construction.
+
+        Parameters
+        ----------
+        solver (str):     solver engine name, 'full' for the full game tree, 'negamax' for alpha-beta search,
+                          'threats' for threat-space search (it is used on open boards anyway)
+                          or 'mcts' for Monte Carlo tree search.
+        budget_ms (int):  time budget of a move in milliseconds or None.
+        max_nodes (int):  nodes budget of a move (count of playouts for 'mcts' solver) or None.
+                          Every move is searched by iterative deepening with some budget,
+                          except lookups in the book and the solved table of the 'full' solver.
+        ponder (bool):    search replies to the opponent moves in the background during the opponent turn
+                          (see AI.ponder).
+        processes (int):  count of processes of root-parallel search of 'mcts' solver.
+        stop (Event):     event which stops searches of solvers (see AI.ponder) or None.
+        """
+        if solver in OPTIONAL_SOLVERS:
+            raise PlayerException('Solver %s makes solved tables only (see build module), it is not an AI solver.' %
+                                  solver)
+        if solver not in AI_SOLVERS:
+            raise PlayerException('Unknown solver: %s. Available solvers: %s' % (solver, ', '.join(AI_SOLVERS)))
         super(AI, self).__init__(self.__AI_move)
+        self.solver_name = solver
+        self.budget_ms = budget_ms
+        self.max_nodes = max_nodes
+        self.processes = processes
+        self.stop = stop
+        # solver engines are made for the game board of the current game
+        self.__solvers = {}
+        # solvers which are used by the current move
+        self.__used_solvers = []
+        self.stats = Stats('ai', AI_STATS, every = 1)
+        self.pondering = ponder
+        # pondered replies: cells of canonical positions by (rules, unique id)
+        self.__ponder_cache = OrderedDict()
+        self.__ponder_thread = None
+        self.__ponder_stop = Event()
+        # the game board of pondered positions (the played game board is not changed)
+        self.__ponder_board = None
+        # the player of the pondering thread: its solvers are not shared with moves of this player
+        self.__ponder_ai = None
 
+    def __get_solver(self, game_board, name = None):
+        """
+        Returns
+        ---------
+        the solver engine for the game board.
+        """
+        name = self.solver_name if name is None else name
+        solver = self.__solvers.get(name)
+        # solvers depend on the game rules only, so they are shared by game boards of different games
+        if solver is None or solver.game_board.table_key() != game_board.table_key():
+            if name == 'threats':
+                solver = ThreatSearch(game_board)
+            elif name == 'mcts':
+                if solver is not None:
+                    solver.close()
+                solver = MCTS(game_board, playouts = self.max_nodes, budget_ms = self.budget_ms,
+                              processes = self.processes)
+            else:
+                solver = make_solver(name, game_board)
+            if hasattr(solver, 'stop'):
+                solver.stop = self.stop
+            self.__solvers[name] = solver
+        self.__used_solvers.append(solver)
+        return solver
+
+
+    def close(self):
+        """
+        Stop pondering and worker processes of solvers (see MCTS.close).
+        """
+        self.stop_pondering()
+        for solver in self.__solvers.values():
+            if hasattr(solver, 'close'):
+                solver.close()
+        if self.__ponder_ai is not None:
+            self.__ponder_ai.close()
 
     def __AI_move(self, game_board):
         """
@@ -65,7 +200,33 @@ class AI(Player):
         ---------
         (int, int) a tuple of coordinates.
         """
-        best_pos = self.__AI_next_position(game_board)
+        # the opponent moved, pondering is not needed anymore
+        self.stop_pondering()
+        stats = self.stats
+        board_nodes = game_board.stats.nodes
+        self.__used_solvers = []
+        # counts of nodes of solvers are growing by searches
+        solver_nodes = dict((id(solver), getattr(solver, 'nodes', 0)) for solver in self.__solvers.values())
+        t = time()
+        best_pos = self.__pondered_position(game_board)
+        if best_pos is None:
+            best_pos = self.__AI_next_position(game_board)
+        else:
+            stats.ponder_hits += 1
+        elapsed = time() - t
+
+        nodes = game_board.stats.nodes - board_nodes
+        for solver in set(self.__used_solvers):
+            nodes += getattr(solver, 'nodes', 0) - solver_nodes.get(id(solver), 0)
+        stats.moves += 1
+        stats.seconds += elapsed
+        stats.last_move_seconds = elapsed
+        stats.max_move_seconds = max(stats.max_move_seconds, elapsed)
+        stats.nodes += nodes
+        stats.last_move_nodes = nodes
+        stats.tick(stats.moves)
+        if self.pondering:
+            self.ponder(game_board, best_pos)
         return self.__move_to(game_board, best_pos)
         
 
@@ -96,58 +257,199 @@ class AI(Player):
             return index / game_board.width + 1, index % game_board.width + 1
 
 
-    def __dummy_prophet(self, gameboard, available_positions):
+    def __budgeted(self):
+        return self.budget_ms is not None or self.max_nodes is not None
+
+    def __solved(self, game_board, empty_count):
         """
-        This function for choosing move when current position is losing.
-        
+        Returns
+        ----------
+        (bool) True if the move from positions with empty_count empty cells is a lookup in the book or the solved table.
+               Budgeted moves are not solved: the book (it is saved with the solved table) must exist.
+        """
+        if self.solver_name != 'full' or empty_count > 12:
+            return False
+        return not self.__budgeted() or load_book(game_board) is not None
+
+    def ponder(self, game_board, position = None):
+        """
+        Start pondering in the background thread: the best replies to every opponent move
+        from the position are searched and cached by unique ids of positions, so the AI move
+        after the real opponent move is a lookup. Positions of the book or the solved table
+        are not pondered. Pondering is stopped by stop_pondering or by the next AI move.
+        Replies are searched by own solvers of the pondering thread, their searches are
+        stopped by the stop event, so stopping waits for a few hundreds of nodes at most.
+
         Parameters
         ----------
-        gameboard (GameBoard): current state of the game board.
-        available_positions (dict): available positions combined by their strength value.
+        game_board (GameBoard): a game board which defines the game rules, it is not changed.
+        position  (str):        the position where the opponent moves, default is the game board position.
+        """
+        self.stop_pondering()
+        position = game_board.position if position is None else position
+        board = self.__ponder_board
+        if board is None or board.table_key() != game_board.table_key():
+            board = GameBoard(game_board.height, game_board.width, bitboard = game_board.bitboard is not None,
+                              winning_len = game_board.winning_len)
+            self.__ponder_board = board
+        board.position = position
+        if board.game_over() or self.__solved(board, position.count(' ') - 1):
+            return
+        if self.__ponder_ai is None:
+            # the root-parallel search is not used by pondering
+            self.__ponder_ai = AI(self.solver_name, self.budget_ms, self.max_nodes, stop = self.__ponder_stop)
+        self.__ponder_stop.clear()
+        self.__ponder_thread = Thread(target = self.__ponder, args = (board, position))
+        # pondering does not keep the process alive
+        self.__ponder_thread.daemon = True
+        self.__ponder_thread.start()
 
-        Retruns
-        ---------- 
-        (int, int) coordinates of move (the first value from 1 to board.height, the second value from 1 to board.width)
+    def stop_pondering(self):
+        """
+        Stop pondering and wait for the thread: the current search of one reply is stopped.
         """
-        max_depth = 0
-        best_pos = None
+        thread = self.__ponder_thread
+        if thread is not None:
+            self.__ponder_stop.set()
+            thread.join()
+            self.__ponder_thread = None
 
-        for pos in available_positions[STATUS.WINNING]:
-            cur_depth = 1 + self.__shortest_game_steps(gameboard, pos, 1)
-            if cur_depth > max_depth:
-                best_pos = pos
-                max_depth = cur_depth
-        return best_pos
+    def __ponder(self, board, position):
+        """
+        The pondering thread function.
+        """
+        player_label = board.player_label(position)
+        ponder_ai = self.__ponder_ai
+        for i, label in enumerate(position):
+            if self.__ponder_stop.is_set():
+                return
+            if label != ' ':
+                continue
+            next_position = position[:i] + player_label + position[i + 1:]
+            board.position = next_position
+            if board.game_over():
+                continue
+            uid, permutation = board.canonical_form(next_position)
+            key = (board.table_key(), uid)
+            if key in self.__ponder_cache:
+                continue
+            try:
+                reply = ponder_ai.__AI_next_position(board)
+            except SearchTimeout:
+                return
+            if self.__ponder_stop.is_set():
+                # the reply of the stopped search is not the best one
+                return
+            cell = [k for k in xrange(len(reply)) if reply[k] != next_position[k]][0]
+            self.__ponder_cache[key] = permutation.index(cell)
+            if len(self.__ponder_cache) > PONDER_CACHE_SIZE:
+                self.__ponder_cache.popitem(last = False)
 
-    def __shortest_game_steps(self, gameboard, pos, cur_depth):
+    def __pondered_position(self, game_board):
         """
-        The current player wants to minimize game steps from position pos.
+        Returns
+        ----------
+        (str) the next position by the pondered reply or None if the position is not pondered.
         """
-        if cur_depth == MAX_SEARCHING_DEPTH: return 0
-        avpos = gameboard.available_positions(pos)
-        lf_count = count_of(avpos, STATUS.LOSING_FINAL)
-        if lf_count > 0:
-            # this trick for minimization the enemy winning positions
-            return 1 if lf_count == 1 else 0 
-        else:
-            min_rec_depth = 1e9
-            for next_pos in avpos[STATUS.LOSING]:
-                min_rec_depth = min(min_rec_depth, 1 + self.__longest_game_steps(gameboard, next_pos, cur_depth + 1))
-            return min_rec_depth
+        if not self.__ponder_cache:
+            return None
+        position = game_board.position
+        uid, permutation = game_board.canonical_form(position)
+        key = (game_board.table_key(), uid)
+        cell = self.__ponder_cache.pop(key, None)
+        if cell is None:
+            return None
+        # the recently used reply is the last one
+        self.__ponder_cache[key] = cell
+        i = permutation[cell]
+        return position[:i] + game_board.player_label(position) + position[i + 1:]
 
+    def choose_moves(self, boards):
+        """
+        Moves for game boards of different games. Equivalent positions are resolved once
+        by their unique ids: by the book of the best moves or the shared solved table,
+        other positions are searched in the canonical form by one solver per game rules,
+        so searches share the transposition table. Game boards are not changed.
+
+        Parameters
+        ----------
+        boards (list): game boards (GameBoard).
 
-    def __longest_game_steps(self, gameboard, pos, cur_depth):
+        Returns
+        ----------
+        (list) coordinates of moves (the first value from 1 to board.height, the second value from 1 to board.width)
+               or None for finished games.
         """
-        The current player wants to maximize game staps from position pos.
-        The position 'pos' is actually losing for current player!!
+        t = time()
+        moves = [None] * len(boards)
+        # the best cells of canonical positions by (rules, unique id)
+        resolved = {}
+        # game boards of canonical positions by rules (the game boards of games are not changed)
+        canonical_boards = {}
+        for k, game_board in enumerate(boards):
+            if game_board.game_over():
+                continue
+            position = game_board.position
+            uid, permutation = game_board.canonical_form(position)
+            key = (game_board.table_key(), uid)
+            if key not in resolved:
+                canonical = ''.join(position[index] for index in permutation)
+                board = canonical_boards.get(key[0])
+                if board is None:
+                    board = GameBoard(game_board.height, game_board.width, bitboard = game_board.bitboard is not None,
+                                      winning_len = game_board.winning_len)
+                    canonical_boards[key[0]] = board
+                resolved[key] = self.__canonical_best_moves(board, canonical, uid)
+            # cells of the canonical position are mapped to cells of the position
+            cells = [permutation[c] for c in resolved[key]]
+            i = cells[randint(0, len(cells) - 1)]
+            moves[k] = (i / game_board.width + 1, i % game_board.width + 1)
+
+        elapsed = time() - t
+        self.stats.moves += len(boards) - moves.count(None)
+        self.stats.seconds += elapsed
+        return moves
+
+    def __canonical_best_moves(self, game_board, canonical, uid):
+        """
+        Parameters
+        ----------
+        game_board (GameBoard):  a game board which defines the game rules, its position is changed.
+        canonical  (str):        the canonical position (see GameBoard.canonical_form).
+        uid        (int):        unique id of the position.
+
+        Returns
+        ----------
+        (list) cells of the best moves in the canonical position.
+        """
+        if self.__solved(game_board, canonical.count(' ')):
+            book = load_book(game_board)
+            mask = book.mask(uid) if book is not None else None
+            if mask is not None:
+                return [c for c in xrange(game_board.tmask_width) if mask >> c & 1]
+            return best_moves(game_board, canonical)
+        game_board.position = canonical
+        next_position = self.__AI_next_position(game_board)
+        return [i for i in xrange(len(canonical)) if canonical[i] != next_position[i]]
+
+    def __best_by_depth(self, game_board, next_positions, fastest):
         """
-        if cur_depth == MAX_SEARCHING_DEPTH: return 0
-        avpos = gameboard.available_positions(pos)
-        max_rec_depth = 0
-        for next_pos in avpos[STATUS.WINNING]:
-            max_rec_depth = max(max_rec_depth, 1 + self.__shortest_game_steps(gameboard, next_pos, cur_depth + 1))
-        return max_rec_depth
+        This function chooses the move by depths of the next positions (see GameBoard.position_depth).
 
+        Parameters
+        ----------
+        game_board (GameBoard): current state of the game board.
+        next_positions (list):  available positions with the same strength.
+        fastest (bool):         the fastest win if True, the longest resistance otherwise.
+
+        Retruns
+        ----------
+        (str) the next position, a random one of the positions with the best depth.
+        """
+        depths = [game_board.position_depth(position) for position in next_positions]
+        best_depth = min(depths) if fastest else max(depths)
+        best = [position for position, depth in zip(next_positions, depths) if depth == best_depth]
+        return best[randint(0, len(best) - 1)]
 
     def __AI_next_position(self, game_board):
         """
@@ -166,11 +468,35 @@ class AI(Player):
 
         empty = filter(lambda pair : pair[1] == ' ', enumerate(position))
         empty_indexes = map(lambda pair : pair[0], empty)
-        if len(empty_indexes) > 12:
-            i = empty_indexes[randint(0, len(empty_indexes) - 1)]
-            next_position = position[:i] + player_label + position[i + 1:]
-            return next_position
+
+        if self.solver_name == 'mcts':
+            # the tree of the last search is reused, the budget is count of playouts or time
+            i = self.__get_solver(game_board).best_move(position)
+            return position[:i] + player_label + position[i + 1:]
+
+        solved = self.__solved(game_board, len(empty_indexes))
+        if self.__budgeted() and not solved:
+            # bounded move latency: the best move of the deepest completed iteration
+            score, i, depth = self.__get_solver(game_board, 'negamax').search(position, self.budget_ms, self.max_nodes)
+            return position[:i] + player_label + position[i + 1:]
+
+        if self.solver_name == 'negamax':
+            # the search prefers the fastest win and the longest resistance
+            score, moves = self.__get_solver(game_board).best_moves(position)
+            i = moves[randint(0, len(moves) - 1)]
+            return position[:i] + player_label + position[i + 1:]
+
+        if self.solver_name == 'threats' or not solved:
+            # the game tree is too large: threat sequences and heuristic moves
+            i = self.__get_solver(game_board, 'threats').best_move(position)
+            return position[:i] + player_label + position[i + 1:]
         else:
+            # the book of the best moves is generated with the dumps
+            book = load_book(game_board)
+            i = book.move(position) if book is not None else None
+            if i is not None:
+                return position[:i] + player_label + position[i + 1:]
+
             strength = game_board.position_strength(position)
 
             available_positions = game_board.available_positions(position)
@@ -185,10 +511,15 @@ class AI(Player):
             if strength == STATUS.DRAW:
                 ret = random_mask(STATUS.DRAW)
             elif strength == STATUS.WINNING or strength == STATUS.WINNING_FINAL:
-                mask = random_mask(STATUS.LOSING)
-                ret = mask if mask is not None else random_mask(STATUS.LOSING_FINAL)  
+                if STATUS.LOSING_FINAL in available_positions:
+                    ret = random_mask(STATUS.LOSING_FINAL)
+                else:
+                    # the fastest win
+                    ret = self.__best_by_depth(game_board, available_positions[STATUS.LOSING], True)
             elif strength == STATUS.LOSING or strength == STATUS.LOSING_FINAL:
-                return self.__dummy_prophet(game_board, available_positions)
+                # the longest resistance
+                next_positions = sum(available_positions.values(), [])
+                return self.__best_by_depth(game_board, next_positions, False)
             else:
                 raise PlayerException('Unknown statuses of available positions.')
             return ret
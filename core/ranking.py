@@ -0,0 +1,351 @@
+# external imports:
+import struct
+from bisect import bisect_right
+
+# internal imports:
+from gameboard import BASE, LABELS
+
+
+# ternary digits of keys are converted by chunks of cells
+CHUNK_CELLS = 6
+CHUNK_SIZE = BASE**CHUNK_CELLS
+CHUNK_DIGITS = [tuple(value // BASE**(CHUNK_CELLS - 1 - i) % BASE for i in xrange(CHUNK_CELLS))
+                for value in xrange(CHUNK_SIZE)]
+# blocks of the bitmap of canonical ranking are 64 bits words
+BLOCK = struct.Struct('<Q')
+BLOCK_BITS = 8 * BLOCK.size
+# count of positions before the block of the bitmap
+DIRECTORY_ENTRY = struct.Struct('<I')
+# layouts of canonical ranking: the bitmap of all valid positions with the directory or sorted ternary values
+BITMAP_LAYOUT = 0
+SORTED_LAYOUT = 1
+# layout and count of positions of canonical ranking
+RANKING_HEADER = struct.Struct('<BQ')
+# ternary value of a position of the sorted layout
+KEY = struct.Struct('<Q')
+
+
+def popcount(data):
+    """
+    Returns
+    ----------
+    (int) count of set bits of the data (str or bytearray).
+    """
+    return bin(int(str(data).encode('hex'), 16)).count('1') if len(data) else 0
+
+
+def binomials(n):
+    """
+    Returns
+    ----------
+    (list) table of binomial coefficients: binomials(n)[i][k] is C(i, k) for 0 <= i, k <= n (zero for k > i).
+    """
+    table = [[0] * (n + 1) for _ in xrange(n + 1)]
+    for i in xrange(n + 1):
+        table[i][0] = 1
+        for k in xrange(1, i + 1):
+            table[i][k] = table[i - 1][k - 1] + table[i - 1][k]
+    return table
+
+
+class PositionRanking(object):
+    def __init__(self, cells):
+        """
+        Dense ranking of valid positions: the count of 'X' labels is equal to the count of 'O' labels
+        or greater by one (see GameBoard.player_label). Positions are ordered by the count of labels,
+        then by the combination of 'X' cells and by the combination of 'O' cells among other cells
+        (combinations are ranked in the colexicographic order), so rank and unrank are O(cells).
+
+        Parameters
+        ----------
+        cells (int): count of cells of the game board.
+        """
+        self.cells = cells
+        self.key_space = BASE**cells
+        self.binomials = binomials(cells)
+        # the first rank of positions with n labels
+        self.offsets = [0]
+        for n in xrange(cells + 1):
+            x, o = (n + 1) // 2, n // 2
+            self.offsets.append(self.offsets[-1] + self.binomials[cells][x] * self.binomials[cells - x][o])
+
+    def __len__(self):
+        return self.offsets[-1]
+
+    def __combination_unrank(self, rank, k):
+        indicies = []
+        c = self.cells
+        for j in xrange(k, 0, -1):
+            c -= 1
+            while self.binomials[c][j] > rank:
+                c -= 1
+            rank -= self.binomials[c][j]
+            indicies.append(c)
+        return indicies[::-1]
+
+    def rank_digits(self, digits):
+        """
+        Parameters
+        ----------
+        digits (list): label indicies of cells (see LABELS).
+
+        Returns
+        ----------
+        (int) rank of the position or None if the position is not valid.
+        """
+        # colex ranks of combinations: the j-th cell c of the combination adds C(c, j)
+        binomials = self.binomials
+        x = o = free = 0
+        x_rank = o_rank = 0
+        for i, digit in enumerate(digits):
+            if digit == 1:
+                x += 1
+                x_rank += binomials[i][x]
+                continue
+            if digit == 2:
+                # 'O' cells are indexed among the cells without 'X' labels
+                o += 1
+                o_rank += binomials[free][o]
+            free += 1
+        if x - o not in (0, 1):
+            return None
+        return self.offsets[x + o] + x_rank * binomials[self.cells - x][o] + o_rank
+
+    def unrank_digits(self, rank):
+        """
+        Returns
+        ----------
+        (list) label indicies of cells of the position with the rank.
+        """
+        if not 0 <= rank < len(self):
+            raise IndexError('Rank %d is out of range.' % rank)
+        n = bisect_right(self.offsets, rank) - 1
+        x, o = (n + 1) // 2, n // 2
+        x_rank, o_rank = divmod(rank - self.offsets[n], self.binomials[self.cells - x][o])
+        digits = [0] * self.cells
+        for i in self.__combination_unrank(x_rank, x):
+            digits[i] = 1
+        free_cells = [i for i in xrange(self.cells) if digits[i] == 0]
+        for i in self.__combination_unrank(o_rank, o):
+            digits[free_cells[i]] = 2
+        return digits
+
+    def rank(self, position):
+        """
+        Parameters
+        ----------
+        position  (str):   a position in the text representation.
+
+        Returns
+        ----------
+        (int) rank of the position or None if the position is not valid.
+        """
+        return self.rank_digits([LABELS.index(label) for label in position])
+
+    def unrank(self, rank):
+        """
+        Returns
+        ----------
+        (str) the position with the rank in the text representation.
+        """
+        return ''.join(LABELS[digit] for digit in self.unrank_digits(rank))
+
+    def rank_key(self, key):
+        """
+        Parameters
+        ----------
+        key (int): ternary value of a position (see GameBoard.unique_id), the first cell is the highest digit.
+
+        Returns
+        ----------
+        (int) rank of the position or None if the position is not valid.
+        """
+        if not 0 <= key < self.key_space:
+            return None
+        # digits of CHUNK_CELLS cells are taken at once, from the last cells
+        chunks = []
+        while key:
+            key, chunk = divmod(key, CHUNK_SIZE)
+            chunks.append(CHUNK_DIGITS[chunk])
+        digits = [digit for chunk in reversed(chunks) for digit in chunk]
+        # leading zero digits are added or dropped
+        digits = [0] * (self.cells - len(digits)) + digits[max(0, len(digits) - self.cells):]
+        return self.rank_digits(digits)
+
+    def unrank_key(self, rank):
+        """
+        Returns
+        ----------
+        (int) ternary value of the position with the rank.
+        """
+        key = 0
+        for digit in self.unrank_digits(rank):
+            key = key * BASE + digit
+        return key
+
+
+class CanonicalRanking(object):
+    def __init__(self, cells, data, offset = 0):
+        """
+        Dense ranking of a set of positions (canonical positions of a table). The bitmap layout is
+        the bitmap of positions by their ranks (see PositionRanking) and the directory of counts of positions
+        before every block of the bitmap: rank is O(cells), the rank of the position, the directory entry
+        of its block and the count of bits before it in the block. The bitmap covers all valid positions,
+        so sparse sets (tables of exactly solved positions) are sorted ternary values of positions instead:
+        rank is the binary search. Data can be a memory-mapped file (see build).
+
+        Parameters
+        ----------
+        cells (int):            count of cells of the game board.
+        data (str or mmap):     data of the ranking (see build).
+        offset (int):           offset of the ranking in the data.
+        """
+        self.positions = PositionRanking(cells)
+        self.data = data
+        self.layout, self.count = RANKING_HEADER.unpack_from(data, offset)
+        offset += RANKING_HEADER.size
+        if self.layout == BITMAP_LAYOUT:
+            self.blocks = -(-len(self.positions) // BLOCK_BITS)
+            self.directory_offset = offset
+            # the directory has one more entry: the count of all positions
+            self.bitmap_offset = offset + DIRECTORY_ENTRY.size * (self.blocks + 1)
+            self.size = RANKING_HEADER.size + DIRECTORY_ENTRY.size * (self.blocks + 1) + BLOCK.size * self.blocks
+        elif self.layout == SORTED_LAYOUT:
+            self.keys_offset = offset
+            self.size = RANKING_HEADER.size + KEY.size * self.count
+        else:
+            raise ValueError('Unknown layout %d of the ranking.' % self.layout)
+
+    @staticmethod
+    def build(cells, keys):
+        """
+        The layout is the smaller one: the bitmap of all valid positions or sorted ternary values.
+
+        Parameters
+        ----------
+        cells (int):        count of cells of the game board.
+        keys (iterable):    ternary values of positions (see GameBoard.unique_id).
+
+        Returns
+        ----------
+        (str) data of the ranking of the positions (see CanonicalRanking.size).
+        """
+        positions = PositionRanking(cells)
+        keys = sorted(keys)
+        ranks = [positions.rank_key(key) for key in keys]
+        if None in ranks:
+            raise ValueError('Position %d is not valid.' % keys[ranks.index(None)])
+        blocks = -(-len(positions) // BLOCK_BITS)
+        if KEY.size * len(keys) < (DIRECTORY_ENTRY.size + BLOCK.size) * blocks and BASE**cells <= 2**(8 * KEY.size):
+            return RANKING_HEADER.pack(SORTED_LAYOUT, len(keys)) + ''.join(KEY.pack(key) for key in keys)
+        bitmap = bytearray(BLOCK.size * blocks)
+        for rank in ranks:
+            bitmap[rank >> 3] |= 1 << (rank & 7)
+        directory = []
+        count = 0
+        for block in xrange(blocks + 1):
+            directory.append(DIRECTORY_ENTRY.pack(count))
+            count += popcount(bitmap[BLOCK.size * block : BLOCK.size * (block + 1)])
+        return RANKING_HEADER.pack(BITMAP_LAYOUT, len(keys)) + ''.join(directory) + str(bitmap)
+
+    def __directory(self, block):
+        return DIRECTORY_ENTRY.unpack_from(self.data, self.directory_offset + DIRECTORY_ENTRY.size * block)[0]
+
+    def __key(self, index):
+        return KEY.unpack_from(self.data, self.keys_offset + KEY.size * index)[0]
+
+    def __len__(self):
+        return self.count
+
+    def rank(self, key):
+        """
+        Parameters
+        ----------
+        key (int): ternary value of a position (see GameBoard.unique_id).
+
+        Returns
+        ----------
+        (int) rank of the position or None if the position is not in the set.
+        """
+        if self.layout == SORTED_LAYOUT:
+            low, high = 0, self.count
+            while low < high:
+                middle = (low + high) // 2
+                if self.__key(middle) < key:
+                    low = middle + 1
+                else:
+                    high = middle
+            return low if low < self.count and self.__key(low) == key else None
+        rank = self.positions.rank_key(key)
+        if rank is None:
+            return None
+        block, bit = divmod(rank, BLOCK_BITS)
+        word = BLOCK.unpack_from(self.data, self.bitmap_offset + BLOCK.size * block)[0]
+        if not word >> bit & 1:
+            return None
+        return self.__directory(block) + bin(word & ((1 << bit) - 1)).count('1')
+
+    def unrank(self, rank):
+        """
+        Returns
+        ----------
+        (int) ternary value of the position with the rank.
+        """
+        if not 0 <= rank < self.count:
+            raise IndexError('Rank %d is out of range.' % rank)
+        if self.layout == SORTED_LAYOUT:
+            return self.__key(rank)
+        # the last block which starts before the rank
+        low, high = 0, self.blocks - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.__directory(middle) <= rank:
+                low = middle
+            else:
+                high = middle - 1
+        index = self.__directory(low)
+        for position_rank in self.__block_ranks(low):
+            if index == rank:
+                return self.positions.unrank_key(position_rank)
+            index += 1
+
+    def __block_ranks(self, block):
+        """
+        Ranks of positions (see PositionRanking) of the block in the increasing order.
+        """
+        word = BLOCK.unpack_from(self.data, self.bitmap_offset + BLOCK.size * block)[0]
+        while word:
+            lowest = word & -word
+            word ^= lowest
+            yield block * BLOCK_BITS + lowest.bit_length() - 1
+
+    def iterkeys(self):
+        """
+        Iteration over ternary values of positions in the order of ranks.
+        """
+        if self.layout == SORTED_LAYOUT:
+            for index in xrange(self.count):
+                yield self.__key(index)
+            return
+        for block in xrange(self.blocks):
+            for position_rank in self.__block_ranks(block):
+                yield self.positions.unrank_key(position_rank)
+
+
+def main():
+    from time import time
+    from gameboard import GameBoard
+    for h, w in [(3, 3), (3, 4), (4, 4)]:
+        cells = h * w
+        ranking = PositionRanking(cells)
+        print 'board size %dx%d: key space %d, valid positions %d (%.1f times less)' % (
+            h, w, BASE**cells, len(ranking), float(BASE**cells) / len(ranking))
+    gb = GameBoard(3, 4)
+    t = time()
+    data = CanonicalRanking.build(gb.tmask_width, (gb.unique_id(position) for position, _, _, _ in gb.iter_positions()))
+    canonical = CanonicalRanking(gb.tmask_width, data)
+    print 'board size 3x4: canonical positions %d, ranking %d bytes, time %.2f' % (len(canonical), len(data), time() - t)
+
+
+if __name__ == '__main__':
+    main()
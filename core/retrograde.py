@@ -0,0 +1,194 @@
+# external imports:
+import numpy as np
+
+# internal imports:
+from gameboard import GameBoard, STATUS, BASE, LABELS
+
+
+# estimation of peak bytes of the solve per ternary rank: ranks, label digits and bitmasks with temporaries
+BYTES_PER_RANK = 32
+# maximal memory of the solve in bytes
+MAX_SOLVE_BYTES = 2**31
+
+class RetrogradeSolver(object):
+    def __init__(self, game_board):
+        """
+        Retrograde (backward induction) solver: positions are processed level by level
+        (by count of labels) as NumPy arrays indexed by the ternary rank of a position.
+        The rank is the unique id without equivalent permutations:
+        the label index of the cell i is the ternary digit with weight BASE**(cells - i - 1).
+
+        Parameters
+        ----------
+        game_board (GameBoard): a game board which defines the game rules.
+        """
+        self.game_board = game_board
+        self.size = game_board.tmask_width
+        solve_bytes = BYTES_PER_RANK * BASE**self.size
+        if solve_bytes > MAX_SOLVE_BYTES:
+            raise ValueError('The board with %d cells is too large for the retrograde solver: '
+                             'the solve needs about %d MB.' % (self.size, solve_bytes // 2**20))
+        self.weights = [BASE**(self.size - i - 1) for i in xrange(self.size)]
+        self.stencil_masks = [sum(1 << i for i in stencil) for stencil in game_board.stencils]
+        # statuses of positions by rank, None before solving
+        self.statuses = None
+        self.reachable = None
+
+    def __digits(self, ranks, i):
+        """
+        Returns
+        ----------
+        (np.array) label indicies in the cell i of positions.
+        """
+        return (ranks // self.weights[i]) % BASE
+
+    def __obvious_statuses(self, x_bits, o_bits, x_count, o_count):
+        """
+        Obvious statuses of all positions by stencils (see GameBoard.__status).
+
+        Returns
+        ----------
+        (np.array) statuses, STATUS.IMPOSSIBLE for positions with wrong count of labels or winnings.
+        """
+        x_win = np.zeros(x_bits.shape, dtype = bool)
+        o_win = np.zeros(x_bits.shape, dtype = bool)
+        alive = np.zeros(x_bits.shape, dtype = bool)
+        for mask in self.stencil_masks:
+            x_in, o_in = x_bits & mask, o_bits & mask
+            x_win |= x_in == mask
+            o_win |= o_in == mask
+            alive |= (x_in == 0) | (o_in == 0)
+
+        x_moves = x_count == o_count
+        # a win of the player which moves from the position only is not possible
+        player_win = np.where(x_moves, x_win & ~o_win, o_win & ~x_win)
+
+        statuses = np.full(x_bits.shape, STATUS.UNKNOWN, dtype = np.int8)
+        statuses[~alive] = STATUS.DRAW
+        statuses[x_win | o_win] = STATUS.LOSING_FINAL
+        statuses[player_win] = STATUS.IMPOSSIBLE
+        statuses[(x_count != o_count) & (x_count != o_count + 1)] = STATUS.IMPOSSIBLE
+        return statuses
+
+    def solve(self, position = None):
+        """
+        Statuses of all reachable positions.
+
+        Parameters
+        ----------
+        position (str): a position in the text representation or None for the initial position.
+
+        Returns
+        ----------
+        (int) position strength for the current player.
+        """
+        if self.statuses is None:
+            self.__solve()
+        if position is None:
+            position = self.game_board.position
+        return self.position_strength(position)
+
+    def __solve(self):
+        n = self.size
+        dtype = np.int64 if BASE**n >= 2**31 else np.int32
+        ranks = np.arange(BASE**n, dtype = dtype)
+
+        # bitmasks and counts of labels by rank
+        x_bits = np.zeros(ranks.shape, dtype = np.int32)
+        o_bits = np.zeros(ranks.shape, dtype = np.int32)
+        x_count = np.zeros(ranks.shape, dtype = np.int8)
+        o_count = np.zeros(ranks.shape, dtype = np.int8)
+        for i in xrange(n):
+            digits = self.__digits(ranks, i)
+            x_bits |= (digits == 1).astype(np.int32) << i
+            o_bits |= (digits == 2).astype(np.int32) << i
+            x_count += digits == 1
+            o_count += digits == 2
+        del ranks
+
+        obvious = self.__obvious_statuses(x_bits, o_bits, x_count, o_count)
+        labels_count = x_count + o_count
+        del x_bits, o_bits, x_count, o_count
+        levels = [np.flatnonzero(labels_count == level).astype(dtype) for level in xrange(n + 1)]
+        del labels_count
+
+        # forward pass: reachable positions level by level
+        reachable = np.zeros(obvious.shape, dtype = bool)
+        reachable[0] = True
+        for level in xrange(n):
+            current = levels[level]
+            current = current[reachable[current] & (obvious[current] == STATUS.UNKNOWN)]
+            label_index = 1 if level % 2 == 0 else 2
+            for i in xrange(n):
+                empty = current[self.__digits(current, i) == 0]
+                reachable[empty + label_index * self.weights[i]] = True
+
+        # backward pass: statuses from the last level to the first one
+        statuses = np.where(reachable, obvious, STATUS.IMPOSSIBLE).astype(np.int8)
+        for level in xrange(n - 1, -1, -1):
+            current = levels[level]
+            current = current[statuses[current] == STATUS.UNKNOWN]
+            label_index = 1 if level % 2 == 0 else 2
+            enemy_losing = np.zeros(current.shape, dtype = bool)
+            enemy_winning = np.zeros(current.shape, dtype = bool)
+            enemy_draw = np.zeros(current.shape, dtype = bool)
+            for i in xrange(n):
+                empty = self.__digits(current, i) == 0
+                child = statuses[current[empty] + label_index * self.weights[i]]
+                enemy_losing[empty] |= (child == STATUS.LOSING) | (child == STATUS.LOSING_FINAL)
+                enemy_winning[empty] |= (child == STATUS.WINNING) | (child == STATUS.WINNING_FINAL)
+                enemy_draw[empty] |= child == STATUS.DRAW
+            # the same rules as GameBoard.__strength_by_moves
+            result = np.full(current.shape, STATUS.DRAW, dtype = np.int8)
+            result[enemy_winning & ~enemy_draw] = STATUS.LOSING
+            result[enemy_losing] = STATUS.WINNING
+            statuses[current] = result
+
+        self.statuses = statuses
+        self.reachable = reachable
+
+    def position_strength(self, position):
+        """
+        Returns
+        ----------
+        (int) position strength for the current player from the solved table.
+        """
+        if self.statuses is None:
+            self.__solve()
+        rank = sum(self.weights[i] * LABELS.index(label) for i, label in enumerate(position))
+        return int(self.statuses[rank])
+
+    def memory(self):
+        """
+        Returns
+        ----------
+        (dict) position strengths by unique ids of all reachable positions (see GameBoard.memoized).
+        """
+        if self.statuses is None:
+            self.__solve()
+        ranks = np.flatnonzero(self.reachable)
+        values = self.statuses[ranks]
+
+        # unique ids are minimal ternary values of equivalent positions
+        uids = None
+        for weights in self.game_board.symmetry_weights:
+            keys = np.zeros(ranks.shape, dtype = np.int64)
+            for i in xrange(self.size):
+                keys += self.__digits(ranks, i) * weights[i]
+            uids = keys if uids is None else np.minimum(uids, keys)
+        return dict(zip(uids.tolist(), values.tolist()))
+
+
+def main():
+    from time import time
+    for h, w in [(3, 3), (3, 4), (4, 3)]:
+        gb = GameBoard(h, w)
+        t = time()
+        solver = RetrogradeSolver(gb)
+        strength = solver.solve()
+        memory = solver.memory()
+        print 'board size %dx%d: strength %d, %d positions, time %.2f' % (h, w, strength, len(memory), time() - t)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,439 @@
+# external imports:
+import asynchat
+import asyncore
+import json
+import os
+import socket
+from collections import deque
+from multiprocessing import Pool
+from Queue import Queue, Empty
+from time import time
+
+# internal imports:
+from book import load_book
+from gameboard import GameBoard, GameBoardException
+from player import AI, AI_SOLVERS
+from simulator import percentile
+
+
+# count of worker processes for AI searches
+WORKERS = 4
+# maximal height and width of game boards of sessions
+MAX_SIDE = 15
+# time budget of AI moves in milliseconds: the default one and the maximal one
+DEFAULT_BUDGET_MS = 1000
+MAX_BUDGET_MS = 10000
+# maximal nodes budget of AI moves
+MAX_NODES = 10**6
+# count of the last requests of a session for latency percentiles
+LATENCY_WINDOW = 1000
+# maximal length of a request line
+MAX_LINE = 65536
+
+
+class ServerException(Exception):
+    def __init__(self, message):
+        super(ServerException, self).__init__(message)
+
+
+class Session(object):
+    def __init__(self, sid, height, width, winning_len = None, ai_label = 'O', ai_options = None):
+        """
+        One game of the server: a game board and the AI player.
+
+        Parameters
+        ----------
+        sid (int):            session id.
+        height  (int):        tic tac toe board height.
+        width   (int):        tic tac toe board width.
+        winning_len (int):    length of winning combinations or None for the default.
+        ai_label (str):       'X' or 'O' label of AI player or None for games without AI.
+        ai_options (dict):    keyword arguments of AI (solver, budget_ms, max_nodes), see ai_options.
+        """
+        if ai_label not in ['X', 'O', None]:
+            raise ServerException('Unknown AI label: %s' % ai_label)
+        if not (1 <= height <= MAX_SIDE and 1 <= width <= MAX_SIDE):
+            raise ServerException('Board size %dx%d is not supported, sides must be from 1 to %d.' %
+                                  (height, width, MAX_SIDE))
+        self.sid = sid
+        self.game_board = GameBoard(height, width, bitboard = True, winning_len = winning_len)
+        self.ai_label = ai_label
+        self.ai_options = ai_options or {}
+        self.ai = AI(**self.ai_options) if ai_label is not None else None
+        # AI search is running in the executor
+        self.busy = False
+        self.requests = 0
+        self.latencies = deque(maxlen = LATENCY_WINDOW)
+
+    def ai_turn(self):
+        gb = self.game_board
+        return self.ai is not None and not gb.game_over() and gb.player_label(gb.position) == self.ai_label
+
+    def trivial_ai_move(self):
+        """
+        Returns
+        ----------
+        (bool) True if the AI move is a lookup in the book of the best moves (see book module):
+               the full game tree AI takes the book move within any budget.
+        """
+        if self.ai.solver_name != 'full':
+            return False
+        book = load_book(self.game_board)
+        return book is not None and book.best_moves(self.game_board.position) is not None
+
+    def ai_move(self):
+        self.ai.move(self.game_board)
+
+    def ai_task(self):
+        """
+        Returns
+        ----------
+        (tuple) the task of the AI move for a worker process (see ai_move_worker).
+        """
+        gb = self.game_board
+        return (gb.height, gb.width, gb.winning_len, tuple(sorted(self.ai_options.items())), gb.position)
+
+    def player_move(self, i, j):
+        """
+        Parameters
+        ----------
+        i  (int):   the first coordinate (from 1 to height).
+        j  (int):   the second coordinate (from 1 to width).
+        """
+        gb = self.game_board
+        if self.busy:
+            raise ServerException('AI is thinking.')
+        if gb.game_over():
+            raise ServerException('The game is over.')
+        if self.ai_turn():
+            raise ServerException('It is the AI turn.')
+        if not (1 <= i <= gb.height and 1 <= j <= gb.width):
+            raise ServerException('Wrong coordinates (%d, %d).' % (i, j))
+        gb.update_position(i, j)
+
+    def close(self):
+        """
+        Release resources of the AI player (see AI.close).
+        """
+        if self.ai is not None:
+            self.ai.close()
+
+    def record(self, latency):
+        self.requests += 1
+        self.latencies.append(latency)
+
+    def latency(self):
+        """
+        Returns
+        ----------
+        (dict) count of requests and latency percentiles of the last requests in milliseconds.
+        """
+        latencies = sorted(self.latencies)
+        return {'requests' : self.requests,
+                'p50_ms' : 1000 * percentile(latencies, 50),
+                'p99_ms' : 1000 * percentile(latencies, 99),
+                'max_ms' : 1000 * latencies[-1] if latencies else 0.0}
+
+    def state(self):
+        gb = self.game_board
+        return {'session' : self.sid, 'height' : gb.height, 'width' : gb.width,
+                'winning_len' : gb.winning_len, 'position' : gb.position,
+                'player' : gb.player_label(gb.position), 'ai' : self.ai_label,
+                'game_over' : gb.game_over(), 'status' : gb.status(),
+                'winning' : gb.winning_indicies(), 'latency' : self.latency()}
+
+
+class Waker(asyncore.file_dispatcher):
+    def __init__(self, server):
+        """
+        Callbacks of the executor threads are called in the event loop:
+        they are queued and the loop is woken by a pipe.
+        """
+        self.server = server
+        self.callbacks = Queue()
+        self.read_fd, self.write_fd = os.pipe()
+        asyncore.file_dispatcher.__init__(self, self.read_fd, map = server.socket_map)
+
+    def call_soon(self, callback, *args):
+        """
+        Queue the callback from any thread.
+        """
+        self.callbacks.put((callback, args))
+        os.write(self.write_fd, 'x')
+
+    def writable(self):
+        return False
+
+    def handle_read(self):
+        self.recv(4096)
+        while True:
+            try:
+                callback, args = self.callbacks.get_nowait()
+            except Empty:
+                break
+            callback(*args)
+
+
+class Connection(asynchat.async_chat):
+    def __init__(self, sock, server):
+        """
+        Client connection: JSON requests and responses, one per line.
+        """
+        asynchat.async_chat.__init__(self, sock, map = server.socket_map)
+        self.server = server
+        self.buffer = []
+        self.length = 0
+        # sessions of the connection are closed with it
+        self.sessions = set()
+        self.set_terminator('\n')
+
+    def collect_incoming_data(self, data):
+        self.length += len(data)
+        if self.length > MAX_LINE:
+            self.close_when_done()
+            return
+        self.buffer.append(data)
+
+    def found_terminator(self):
+        line = ''.join(self.buffer)
+        self.buffer, self.length = [], 0
+        if line.strip():
+            self.server.handle_request(self, line, time())
+
+    def send_json(self, response):
+        if self.connected:
+            self.push(json.dumps(response, sort_keys = True) + '\n')
+
+    def handle_close(self):
+        for sid in self.sessions:
+            session = self.server.sessions.pop(sid, None)
+            if session is not None:
+                session.close()
+        self.sessions.clear()
+        self.close()
+
+
+class GameServer(asyncore.dispatcher):
+    def __init__(self, address, workers = WORKERS):
+        """
+        Game server: many concurrent sessions in one process with the event loop.
+        Solved tables are shared by all sessions (see table.REGISTRY), AI searches
+        which are not book lookups are executed by a pool of processes.
+
+        Requests (JSON lines, the optional 'id' is returned in the response):
+            {"op": "new", "height": 3, "width": 3, "k": null, "ai": "O", "solver": "full", "budget_ms": 1000}
+            {"op": "move", "session": 1, "i": 2, "j": 2}
+            {"op": "state", "session": 1}
+            {"op": "close", "session": 1}
+            {"op": "stats"}
+
+        Parameters
+        ----------
+        address (tuple or str):  (host, port) for TCP or path for Unix socket.
+        workers (int):           count of processes for AI searches.
+        """
+        # worker processes are forked before the server socket is made
+        self.executor = Pool(workers)
+        self.socket_map = {}
+        asyncore.dispatcher.__init__(self, map = self.socket_map)
+        if isinstance(address, tuple):
+            self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.set_reuse_addr()
+        else:
+            if os.path.exists(address):
+                os.unlink(address)
+            self.create_socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.bind(address)
+        self.listen(128)
+        self.address = self.socket.getsockname()
+
+        self.waker = Waker(self)
+        self.sessions = {}
+        self.next_sid = 1
+        self.requests = 0
+        self.offloaded = 0
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is not None:
+            Connection(pair[0], self)
+
+    def handle_request(self, connection, line, started):
+        """
+        Dispatch the request by 'op' field and send the response.
+        """
+        self.requests += 1
+        request = {}
+        session = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ServerException('The request must be a JSON object.')
+            op = request.get('op')
+            if op == 'new':
+                session = self.__new_session(connection, request)
+            elif op == 'stats':
+                return self.__respond(connection, request, None, started, self.stats())
+            else:
+                session = self.sessions.get(request.get('session'))
+                if session is None:
+                    raise ServerException('Unknown session: %s' % request.get('session'))
+                if op == 'move':
+                    session.player_move(int(request['i']), int(request['j']))
+                elif op == 'close':
+                    self.sessions.pop(session.sid, None)
+                    connection.sessions.discard(session.sid)
+                    session.close()
+                    return self.__respond(connection, request, session, started, {'session' : session.sid, 'closed' : True})
+                elif op != 'state':
+                    raise ServerException('Unknown operation: %s' % op)
+        except (ValueError, KeyError, TypeError, GameBoardException, ServerException) as e:
+            return self.__respond(connection, request, session, started, {'error' : str(e)})
+
+        if session.ai_turn() and not session.busy:
+            if session.trivial_ai_move():
+                session.ai_move()
+            else:
+                # the search is executed by the pool, the response is sent after it
+                session.busy = True
+                self.offloaded += 1
+                done = lambda result : self.waker.call_soon(self.__ai_done, connection, request, session, started, result)
+                self.executor.apply_async(ai_move_worker, (session.ai_task(),), callback = done)
+                return
+        self.__respond(connection, request, session, started)
+
+    def __ai_done(self, connection, request, session, started, result):
+        session.busy = False
+        move, error = result
+        if error is None:
+            try:
+                session.game_board.update_position(*move)
+            except GameBoardException as e:
+                error = str(e)
+        if error is not None:
+            return self.__respond(connection, request, session, started, {'error' : 'AI move failed: %s' % error})
+        self.__respond(connection, request, session, started)
+
+    def __new_session(self, connection, request):
+        sid = self.next_sid
+        self.next_sid += 1
+        winning_len = request.get('k')
+        session = Session(sid, int(request.get('height', 3)), int(request.get('width', 3)),
+                          int(winning_len) if winning_len is not None else None, request.get('ai', 'O'),
+                          ai_options(request))
+        self.sessions[sid] = session
+        connection.sessions.add(sid)
+        return session
+
+    def __respond(self, connection, request, session, started, response = None):
+        """
+        Send the response, the default response is the session state.
+        """
+        if session is not None:
+            session.record(time() - started)
+        if response is None:
+            response = session.state()
+        if 'id' in request:
+            response['id'] = request['id']
+        connection.send_json(response)
+
+    def stats(self):
+        return {'sessions' : len(self.sessions), 'requests' : self.requests,
+                'offloaded' : self.offloaded, 'busy' : sum(1 for s in self.sessions.values() if s.busy)}
+
+    def serve_forever(self):
+        try:
+            asyncore.loop(timeout = 1, map = self.socket_map)
+        finally:
+            self.executor.terminate()
+
+    def shutdown(self):
+        """
+        Close all sockets, the event loop stops, running searches are terminated.
+        """
+        for dispatcher in self.socket_map.values():
+            dispatcher.close()
+        for session in self.sessions.values():
+            session.close()
+        self.executor.terminate()
+
+
+def ai_options(request):
+    """
+    AI options of the request are limited by the server: every AI move of workers is bounded
+    by the time budget (see DEFAULT_BUDGET_MS, MAX_BUDGET_MS) and the nodes budget (see MAX_NODES).
+
+    Parameters
+    ----------
+    request (dict): the request of the new session with optional 'solver', 'budget_ms' and 'max_nodes'.
+
+    Returns
+    ----------
+    (dict) keyword arguments of AI.
+    """
+    solver = request.get('solver', 'full')
+    if solver not in AI_SOLVERS:
+        raise ServerException('Unknown solver: %s. Available solvers: %s' % (solver, ', '.join(AI_SOLVERS)))
+    budget_ms = request.get('budget_ms')
+    budget_ms = DEFAULT_BUDGET_MS if budget_ms is None else int(budget_ms)
+    if budget_ms <= 0:
+        raise ServerException('The time budget must be positive.')
+    options = {'solver' : solver, 'budget_ms' : min(budget_ms, MAX_BUDGET_MS)}
+    max_nodes = request.get('max_nodes')
+    if max_nodes is not None:
+        if int(max_nodes) <= 0:
+            raise ServerException('The nodes budget must be positive.')
+        options['max_nodes'] = min(int(max_nodes), MAX_NODES)
+    return options
+
+
+# game boards and AI players of the worker process by game rules and AI options,
+# so solved tables and search trees are reused between moves
+_worker_players = {}
+
+def ai_move_worker(task):
+    """
+    Worker process function: the AI move in the position (see Session.ai_task).
+
+    Parameters
+    ----------
+    task (tuple): height, width, winning length, AI options as (name, value) pairs and the position.
+
+    Returns
+    ----------
+    (tuple) coordinates of the move or None.
+    (str) the error message or None.
+    """
+    height, width, winning_len, ai_options, position = task
+    try:
+        key = (height, width, winning_len, ai_options)
+        if key not in _worker_players:
+            _worker_players[key] = (GameBoard(height, width, bitboard = True, winning_len = winning_len),
+                                    AI(**dict(ai_options)))
+        game_board, ai = _worker_players[key]
+        game_board.position = position
+        return ai.next_move(game_board), None
+    except Exception as e:
+        return None, str(e)
+
+
+def parse_address(address):
+    """
+    Returns
+    ----------
+    (tuple or str) (host, port) for 'host:port' or 'port', a path of Unix socket otherwise.
+    """
+    host, _, port = address.rpartition(':')
+    if port.isdigit():
+        return (host or '127.0.0.1', int(port))
+    return address
+
+
+def main():
+    server = GameServer(('127.0.0.1', 8765))
+    print 'serving on %s:%d' % server.address
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+# external imports:
+import random
+from collections import Counter
+from multiprocessing import Pool, cpu_count
+from time import time
+
+# internal imports:
+from gameboard import GameBoard
+from player import AI, RandomPlayer, PlayerException
+
+
+# outcomes of games
+OUTCOMES = ['X', 'O', 'draw']
+# percentiles of move latencies in reports
+PERCENTILES = [50, 90, 99]
+
+
+def make_player(kind, ai_options = None):
+    """
+    Player by the kind name.
+
+    Parameters
+    ----------
+    kind (str):          'ai' or 'random'.
+    ai_options (dict):   keyword arguments of AI (solver, budget_ms, max_nodes).
+
+    Returns
+    ----------
+    (Player) a player instance.
+    """
+    if kind == 'ai':
+        return AI(**(ai_options or {}))
+    elif kind == 'random':
+        return RandomPlayer()
+    raise PlayerException('Unknown player kind: %s. Available kinds: ai, random' % kind)
+
+
+def play_game(game_board, players):
+    """
+    One headless game from the empty board.
+
+    Parameters
+    ----------
+    game_board (GameBoard):   a game board, its position is reset.
+    players (list):           the first and the second players.
+
+    Returns
+    ----------
+    (str) the outcome (see OUTCOMES).
+    (list) latencies of moves in seconds.
+    """
+    game_board.position = ' ' * game_board.tmask_width
+    latencies = []
+    player_index = 0
+    while not game_board.game_over():
+        t = time()
+        players[player_index].move(game_board)
+        latencies.append(time() - t)
+        player_index = (player_index + 1) % 2
+    if game_board.winning_indicies():
+        # the last moved player wins
+        return OUTCOMES[(len(latencies) - 1) % 2], latencies
+    return 'draw', latencies
+
+
+def simulate_games(task):
+    """
+    Worker process function: play some games by the same players and game board,
+    so the solved table is loaded once per worker (see table.REGISTRY).
+
+    Parameters
+    ----------
+    task (tuple): height, width, winning length, kinds of players, AI options, count of games and random seed.
+
+    Returns
+    ----------
+    (Counter) outcomes of games.
+    (list) latencies of moves in seconds.
+    """
+    height, width, winning_len, kinds, ai_options, games, seed = task
+    random.seed(seed)
+    game_board = GameBoard(height, width, bitboard = True, winning_len = winning_len)
+    players = [make_player(kind, ai_options) for kind in kinds]
+    outcomes = Counter()
+    latencies = []
+    try:
+        for _ in xrange(games):
+            outcome, game_latencies = play_game(game_board, players)
+            outcomes[outcome] += 1
+            latencies.extend(game_latencies)
+    finally:
+        for player in players:
+            player.close()
+    return outcomes, latencies
+
+
+def percentile(values, p):
+    """
+    Returns
+    ----------
+    (float) the nearest-rank percentile of sorted values.
+    """
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(p / 100.0 * len(values))) - 1))
+    return values[index]
+
+
+def simulate(height, width, games, kinds = ('ai', 'ai'), processes = None, winning_len = None,
+             ai_options = None, seed = None):
+    """
+    Play games between two players by a pool of processes.
+
+    Parameters
+    ----------
+    height  (int):       tic tac toe board height.
+    width   (int):       tic tac toe board width.
+    games (int):         count of games.
+    kinds (tuple):       kinds of the first and the second players (see make_player).
+    processes (int):     count of worker processes, default is count of CPU.
+    winning_len (int):   length of winning combinations or None for the default.
+    ai_options (dict):   keyword arguments of AI players.
+    seed (int):          random seed of the first worker or None.
+
+    Returns
+    ----------
+    (dict) report: count of games and moves, time, games and moves per second,
+           move latency percentiles in milliseconds and outcomes.
+    """
+    if processes is None: processes = cpu_count()
+    if seed is None: seed = random.randint(0, 2**31)
+    processes = max(1, min(processes, games))
+    tasks = [(height, width, winning_len, tuple(kinds), ai_options, games // processes + (i < games % processes), seed + i)
+             for i in xrange(processes)]
+
+    outcomes = Counter()
+    latencies = []
+    t = time()
+    if processes == 1:
+        results = map(simulate_games, tasks)
+    else:
+        pool = Pool(processes)
+        try:
+            results = pool.map(simulate_games, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    for task_outcomes, task_latencies in results:
+        outcomes.update(task_outcomes)
+        latencies.extend(task_latencies)
+    seconds = time() - t
+
+    latencies.sort()
+    report = {'board' : '%dx%d' % (height, width), 'players' : list(kinds),
+              'games' : games, 'moves' : len(latencies), 'seconds' : seconds,
+              'games_per_sec' : games / seconds if seconds else 0.0,
+              'moves_per_sec' : len(latencies) / seconds if seconds else 0.0,
+              'outcomes' : dict((outcome, outcomes[outcome]) for outcome in OUTCOMES)}
+    for p in PERCENTILES:
+        report['latency_p%d_ms' % p] = 1000 * percentile(latencies, p)
+    report['latency_max_ms'] = 1000 * latencies[-1] if latencies else 0.0
+    return report
+
+
+def format_report(report):
+    """
+    Returns
+    ----------
+    (str) the report in the text representation.
+    """
+    lines = ['board %s, %s vs %s' % (report['board'], report['players'][0], report['players'][1]),
+             '%d games, %d moves in %.2f s: %.1f games/sec, %.1f moves/sec' % (
+                report['games'], report['moves'], report['seconds'], report['games_per_sec'], report['moves_per_sec']),
+             'move latency ms: ' + ', '.join('p%d %.3f' % (p, report['latency_p%d_ms' % p]) for p in PERCENTILES) +
+                ', max %.3f' % report['latency_max_ms'],
+             'outcomes: ' + ', '.join('%s %d' % (outcome, report['outcomes'][outcome]) for outcome in OUTCOMES)]
+    return '\n'.join(lines)
+
+
+def main():
+    for kinds in [('ai', 'ai'), ('ai', 'random'), ('random', 'ai')]:
+        print format_report(simulate(3, 3, 100, kinds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,531 @@
+# external imports:
+from time import time
+
+# internal imports:
+from bitboard import BitBoard
+from gameboard import GameBoard, STATUS, LABELS, E_LABEL
+
+
+# transposition table entry flags
+EXACT, LOWER, UPPER = 0, 1, 2
+# default count of transposition table slots
+TABLE_CAPACITY = 2**20
+# scores of proven wins are WIN_SCORE + count of empty cells, heuristic scores are less
+WIN_SCORE = 10**9
+INFINITY = 2 * WIN_SCORE
+# search depth of the full search (till the end of game)
+FULL_DEPTH = 2**16
+# heuristic weights of stencils by count of labels of one player
+STENCIL_WEIGHT_BASE = 4
+
+
+class SolverException(Exception):
+    def __init__(self, message):
+        super(SolverException, self).__init__(message)
+
+
+class SearchTimeout(Exception):
+    """
+    The search is stopped by the time or nodes budget.
+    """
+    pass
+
+
+class TranspositionTable(object):
+    def __init__(self, capacity = TABLE_CAPACITY):
+        """
+        Bounded transposition table: the slot of an entry is defined by the key,
+        a new entry always replaces an old one in the same slot.
+
+        Parameters
+        ----------
+        capacity (int):   count of slots.
+        """
+        self.capacity = capacity
+        self.slots = [None] * capacity
+
+    def get(self, key):
+        """
+        Returns
+        ----------
+        (tuple) entry (key, depth, flag, score, move) or None if the key is not in the table.
+        """
+        entry = self.slots[key % self.capacity]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def put(self, key, depth, flag, score, move):
+        """
+        Store an entry.
+
+        Parameters
+        ----------
+        key   (int):   canonical position id.
+        depth (int):   search depth, FULL_DEPTH for the full search.
+        flag  (int):   EXACT, LOWER or UPPER bound of the score.
+        score (int):   position score for the current player.
+        move  (int):   the best move in the canonical position or None.
+        """
+        self.slots[key % self.capacity] = (key, depth, flag, score, move)
+
+    def clear(self):
+        self.slots = [None] * self.capacity
+
+    def exact_entries(self):
+        """
+        Returns
+        ----------
+        (list) entries with exact scores of the full search.
+        """
+        return [entry for entry in self.slots if entry is not None and entry[2] == EXACT and entry[1] == FULL_DEPTH]
+
+
+class FullTreeSolver(object):
+    def __init__(self, game_board):
+        """
+        Full game tree calculation by GameBoard.position_strength.
+
+        Parameters
+        ----------
+        game_board (GameBoard): a game board which defines the game rules.
+        """
+        self.game_board = game_board
+
+    def position_strength(self, position):
+        """
+        Returns
+        ----------
+        (int) position strength for the current player.
+        """
+        return self.game_board.position_strength(position)
+
+    def memory(self):
+        """
+        Returns
+        ----------
+        (dict) position strengths by unique ids.
+        """
+        return self.game_board.memory
+
+
+class NegamaxSolver(object):
+    def __init__(self, game_board, capacity = TABLE_CAPACITY):
+        """
+        Negamax search with alpha-beta pruning and transposition table.
+        Scores are counted for the current player: a win is a count of empty cells
+        after the winning move plus one, so faster wins and longer losses are preferred.
+
+        Parameters
+        ----------
+        game_board (GameBoard): a game board which defines the game rules.
+        capacity (int):         count of transposition table slots.
+        """
+        self.game_board = game_board
+        self.size = game_board.tmask_width
+        self.board = BitBoard(game_board.height, game_board.width, game_board.stencils,
+                              LABELS, zip(*game_board.symmetry_weights))
+        self.stencil_masks = self.board.stencil_masks
+        self.cell_stencils = game_board.cell_stencils
+
+        # equivalent permutations: the cell p[k] of a position is the cell k of the equivalent position
+        identity = range(self.size)
+        self.symmetries = [identity] + game_board.eq_permutations
+        self.inverse_symmetries = []
+        for p in self.symmetries:
+            inverse = [0] * self.size
+            for k, index in enumerate(p):
+                inverse[index] = k
+            self.inverse_symmetries.append(inverse)
+
+        # static move ordering: cells with more stencils (center) first
+        count_bits = lambda x : bin(x).count('1')
+        self.static_order = sorted(identity, key = lambda i : -count_bits(self.cell_stencils[i]))
+
+        self.table = TranspositionTable(capacity)
+        # killer moves by ply and history heuristic by cell
+        self.killers = [[None, None] for _ in xrange(self.size + 1)]
+        self.history = [0] * self.size
+        # count of visited nodes and the search budget
+        self.nodes = 0
+        self.deadline = None
+        self.max_nodes = None
+        # event which stops any search by SearchTimeout (see AI.ponder) or None
+        self.stop = None
+
+    def __winning_cells(self, own, enemy, stencils_filter):
+        """
+        Empty cells which complete some stencil for the player.
+
+        Parameters
+        ----------
+        own   (int):            bitmask of the player labels.
+        enemy (int):            bitmask of the enemy labels.
+        stencils_filter (int):  bitmask of allowed stencils.
+
+        Returns
+        ----------
+        (int) bitmask of the cells.
+        """
+        cells = 0
+        stencil_masks = self.stencil_masks
+        while stencils_filter:
+            lowest = stencils_filter & -stencils_filter
+            stencils_filter ^= lowest
+            mask = stencil_masks[lowest.bit_length() - 1]
+            if mask & enemy:
+                continue
+            missing = mask & ~own
+            if missing & (missing - 1) == 0:
+                cells |= missing
+        return cells
+
+    def __child_filter(self, stencils_filter, move, enemy):
+        """
+        Stencils filter after the move: stencils through the move with enemy labels are dropped.
+        """
+        through = stencils_filter & self.cell_stencils[move]
+        while through:
+            lowest = through & -through
+            through ^= lowest
+            if self.stencil_masks[lowest.bit_length() - 1] & enemy:
+                stencils_filter ^= lowest
+        return stencils_filter
+
+    def __ordered_moves(self, empty, tt_move, ply):
+        """
+        Move ordering: transposition table move, killer moves, then by history and static order.
+        """
+        moves = [i for i in self.static_order if empty & (1 << i)]
+        history = self.history
+        moves.sort(key = lambda i : -history[i])
+        first = [m for m in [tt_move] + self.killers[ply] if m is not None and empty & (1 << m)]
+        if first:
+            first = sorted(set(first), key = first.index)
+            moves = first + [m for m in moves if m not in first]
+        return moves
+
+    def __evaluate(self, own, enemy, stencils_filter):
+        """
+        Heuristic evaluation of a position for the current player:
+        every stencil with labels of only one player is weighted by the count of labels.
+
+        Parameters
+        ----------
+        own   (int):            bitmask of the player labels.
+        enemy (int):            bitmask of the enemy labels.
+        stencils_filter (int):  bitmask of allowed stencils.
+
+        Returns
+        ----------
+        (int) score, its absolute value is less than WIN_SCORE.
+        """
+        score = 0
+        stencil_masks = self.stencil_masks
+        while stencils_filter:
+            lowest = stencils_filter & -stencils_filter
+            stencils_filter ^= lowest
+            mask = stencil_masks[lowest.bit_length() - 1]
+            own_in, enemy_in = mask & own, mask & enemy
+            if own_in and not enemy_in:
+                score += STENCIL_WEIGHT_BASE**bin(own_in).count('1')
+            elif enemy_in and not own_in:
+                score -= STENCIL_WEIGHT_BASE**bin(enemy_in).count('1')
+        return score
+
+    def __check_budget(self):
+        """
+        Stop the search by SearchTimeout if the time or nodes budget is exhausted or the stop event is set.
+        """
+        if self.max_nodes is not None and self.nodes >= self.max_nodes:
+            raise SearchTimeout()
+        if self.nodes & 255 == 0:
+            if self.deadline is not None and time() >= self.deadline:
+                raise SearchTimeout()
+            if self.stop is not None and self.stop.is_set():
+                raise SearchTimeout()
+
+    def __negamax(self, board, stencils_filter, alpha, beta, ply, depth = FULL_DEPTH):
+        """
+        Negamax search of a position which is not final.
+
+        Parameters
+        ----------
+        board (BitBoard):       current position.
+        stencils_filter (int):  bitmask of allowed stencils.
+        alpha, beta (int):      search window.
+        ply (int):              depth from the root.
+        depth (int):            remaining search depth, positions on zero depth are evaluated heuristically.
+
+        Returns
+        ----------
+        (int) score for the current player.
+        (int) the best move or None.
+        """
+        self.nodes += 1
+        self.__check_budget()
+        empties = self.size - board.moves
+        if empties == 0 or stencils_filter == 0:
+            return 0, None
+        if depth >= empties:
+            depth = FULL_DEPTH
+
+        if board.moves & 1:
+            own, enemy = board.o_mask, board.x_mask
+        else:
+            own, enemy = board.x_mask, board.o_mask
+
+        # threat-first: an immediate win or the only defence
+        wins = self.__winning_cells(own, enemy, stencils_filter)
+        if wins:
+            return WIN_SCORE + empties, (wins & -wins).bit_length() - 1
+        threats = self.__winning_cells(enemy, own, stencils_filter)
+        if threats & (threats - 1):
+            # two threats can not be blocked by one move
+            return -(WIN_SCORE + empties - 1), (threats & -threats).bit_length() - 1
+        if depth == 0:
+            return self.__evaluate(own, enemy, stencils_filter), None
+
+        keys = board.keys
+        key = min(keys)
+        symmetry = keys.index(key)
+        tt_move = None
+        alpha_orig = alpha
+        entry = self.table.get(key)
+        if entry is not None:
+            _, entry_depth, flag, score, canonical_move = entry
+            if canonical_move is not None:
+                tt_move = self.symmetries[symmetry][canonical_move]
+            if entry_depth < depth:
+                # the score of a shallow search is useful for move ordering only
+                pass
+            elif flag == EXACT:
+                return score, tt_move
+            elif flag == LOWER:
+                alpha = max(alpha, score)
+            else:
+                beta = min(beta, score)
+            if alpha >= beta:
+                return score, tt_move
+
+        if threats:
+            moves = [threats.bit_length() - 1]
+        else:
+            moves = self.__ordered_moves(self.__empty_cells(board), tt_move, ply)
+
+        child_depth = depth if depth == FULL_DEPTH else depth - 1
+        best_score, best_move = -INFINITY, None
+        for move in moves:
+            board.make_move(move)
+            try:
+                child_filter = self.__child_filter(stencils_filter, move, enemy)
+                score = -self.__negamax(board, child_filter, -beta, -alpha, ply + 1, child_depth)[0]
+            finally:
+                board.unmake_move(move)
+            if score > best_score:
+                best_score, best_move = score, move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                # beta cutoff: remember the killer move
+                killers = self.killers[ply]
+                if killers[0] != move:
+                    killers[1], killers[0] = killers[0], move
+                self.history[move] += empties * empties
+                break
+
+        if best_score <= alpha_orig:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table.put(key, depth, flag, best_score, self.inverse_symmetries[symmetry][best_move])
+        return best_score, best_move
+
+    def __empty_cells(self, board):
+        """
+        Returns
+        ----------
+        (int) bitmask of empty cells.
+        """
+        return ((1 << self.size) - 1) & ~(board.x_mask | board.o_mask)
+
+    def __load(self, position):
+        """
+        Load a position to the search board.
+
+        Returns
+        ----------
+        (int) a score if the position is final or None.
+        (int) bitmask of allowed stencils.
+        """
+        board = self.board
+        board.load(position)
+        game_board = self.game_board
+        game_board.player_label(position)
+        wining_count, stencils_filter = board.scan(game_board.default_stencils_filter)
+        if sum(wining_count) > 0:
+            if wining_count[board.player_index()] > 0:
+                raise SolverException('Position is not possible: %s' % position)
+            # the previous move was winning
+            return -(WIN_SCORE + self.size - board.moves + 1), stencils_filter.bitmask
+        return None, stencils_filter.bitmask
+
+    def solve(self, position, alpha = None, beta = None):
+        """
+        Position score by negamax search.
+
+        Parameters
+        ----------
+        position (str):     a position in the text representation.
+        alpha, beta (int):  search window or None for exact score.
+
+        Returns
+        ----------
+        (int) score for the current player.
+        (int) the best move index or None.
+        """
+        final_score, stencils_filter = self.__load(position)
+        if final_score is not None:
+            return final_score, None
+        alpha = -INFINITY if alpha is None else alpha
+        beta = INFINITY if beta is None else beta
+        return self.__negamax(self.board, stencils_filter, alpha, beta, 0)
+
+    def search(self, position, budget_ms = None, max_nodes = None):
+        """
+        Iterative deepening search with heuristic evaluation of leaf positions.
+        The result of the deepest completed iteration is returned when the budget is exhausted.
+
+        Parameters
+        ----------
+        position (str):    a position in the text representation.
+        budget_ms (int):   time budget in milliseconds or None.
+        max_nodes (int):   nodes budget or None.
+
+        Returns
+        ----------
+        (int) score for the current player.
+        (int) the best move index or None if the position is final.
+        (int) depth of the deepest completed iteration.
+        """
+        final_score, stencils_filter = self.__load(position)
+        if final_score is not None:
+            return final_score, None, 0
+        empties = self.size - self.board.moves
+
+        self.deadline = None if budget_ms is None else time() + budget_ms / 1000.0
+        self.max_nodes = None if max_nodes is None else self.nodes + max_nodes
+        # the first cell in the static order if no iteration is completed
+        best_score, completed_depth = 0, 0
+        best_move = [i for i in self.static_order if position[i] == E_LABEL][0]
+        try:
+            for depth in xrange(1, empties + 1):
+                score, move = self.__negamax(self.board, stencils_filter, -INFINITY, INFINITY, 0, depth)
+                best_score, completed_depth = score, depth
+                if move is not None:
+                    best_move = move
+                if abs(score) >= WIN_SCORE or move is None:
+                    # the result is proven
+                    break
+        except SearchTimeout:
+            pass
+        finally:
+            self.deadline = None
+            self.max_nodes = None
+        return best_score, best_move, completed_depth
+
+    def position_strength(self, position):
+        """
+        Returns
+        ----------
+        (int) position strength for the current player.
+        """
+        final_score, stencils_filter = self.__load(position)
+        if final_score is not None:
+            return STATUS.LOSING_FINAL
+        # null window searches are enough for win/draw/loss detection
+        score = self.__negamax(self.board, stencils_filter, 0, 1, 0)[0]
+        if score > 0:
+            return STATUS.WINNING
+        score = self.__negamax(self.board, stencils_filter, -1, 0, 0)[0]
+        return STATUS.LOSING if score < 0 else STATUS.DRAW
+
+    def best_moves(self, position):
+        """
+        All moves with the best score.
+
+        Parameters
+        ----------
+        position (str):   a position in the text representation.
+
+        Returns
+        ----------
+        (int) the best score for the current player.
+        (list) indicies of the best moves.
+        """
+        empty = [i for i, label in enumerate(position) if label == E_LABEL]
+        best_score, best_move = self.solve(position)
+        if best_move is None:
+            # all moves are equal if there are no stencils for winning, no moves if the position is final
+            return best_score, empty if best_score == 0 else []
+        moves = [best_move]
+        player_label = self.game_board.player_label(position)
+        for i in empty:
+            if i == best_move:
+                continue
+            next_position = position[:i] + player_label + position[i + 1:]
+            # null window: does the move keep the best score?
+            score = -self.solve(next_position, -best_score, -best_score + 1)[0]
+            if score >= best_score:
+                moves.append(i)
+        return best_score, moves
+
+    def memory(self):
+        """
+        Returns
+        ----------
+        (dict) position strengths by unique ids for exactly solved positions.
+        """
+        strength = lambda score : STATUS.WINNING if score > 0 else (STATUS.LOSING if score < 0 else STATUS.DRAW)
+        return dict((entry[0], strength(entry[3])) for entry in self.table.exact_entries())
+
+
+SOLVERS = {'full' : FullTreeSolver, 'negamax' : NegamaxSolver}
+# solvers with optional dependencies (NumPy etc.): module and class names
+OPTIONAL_SOLVERS = {'retrograde' : ('retrograde', 'RetrogradeSolver')}
+
+def make_solver(name, game_board):
+    """
+    Solver engine by name.
+
+    Parameters
+    ----------
+    name (str):              'full', 'negamax' or 'retrograde'.
+    game_board (GameBoard):  a game board which defines the game rules.
+
+    Returns
+    ----------
+    solver instance
+    """
+    if name in OPTIONAL_SOLVERS:
+        module_name, class_name = OPTIONAL_SOLVERS[name]
+        return getattr(__import__(module_name, globals()), class_name)(game_board)
+    if name not in SOLVERS:
+        names = ', '.join(sorted(SOLVERS.keys() + OPTIONAL_SOLVERS.keys()))
+        raise SolverException('Unknown solver: %s. Available solvers: %s' % (name, names))
+    return SOLVERS[name](game_board)
+
+
+def main():
+    for h, w in [(3, 3), (3, 4), (4, 4)]:
+        gb = GameBoard(h, w, bitboard = True)
+        solver = NegamaxSolver(gb)
+        t = time()
+        score, moves = solver.best_moves(gb.position)
+        print h, w, 'score', score, 'best moves', moves, 'nodes', solver.nodes, 'time %.2f' % (time() - t)
+
+
+if __name__ == '__main__':
+    main()
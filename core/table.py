@@ -0,0 +1,445 @@
+# external imports:
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+# Binary table format of solved positions:
+#   header (see HEADER and CANONICAL_HEADER), then entries of entry bits indexed by position unique id.
+#   The low VALUE_BITS bits of an entry are (value + 1), zero is for unknown positions.
+#   Version 2: the high bits of an entry are (depth + 1), zero is for unknown depth;
+#   entries are 8 bits for small boards and 16 bits for other ones (see entry_bits).
+#   Version 1: entries are 4 bits without depths.
+#   Version 3: entries of version 2 are indexed by the dense rank of the unique id (see ranking.PositionRanking).
+#   Version 4 (default): the header with the winning length, the ranking of positions of the table
+#   (see ranking.CanonicalRanking: the bitmap of all valid positions or sorted unique ids of sparse tables),
+#   then entries of these positions only, indexed by their ranks.
+#   Values of entries are CANONICAL_VALUE_BITS bits, so entries with depths are 8 bits till 30 cells.
+#   The header of version 4 records the solver of the table and flags of its completeness (see COMPLETE).
+MAGIC = 'TTTB'
+VERSION = 4
+RAW_VERSION = 2
+RANKED_VERSION = 3
+SUPPORTED_VERSIONS = {1 : [4], 2 : [8, 16], 3 : [8, 16], 4 : [8, 16]}
+VALUE_BITS = 4
+# values of version 4 entries: STATUS values (see gameboard module) plus one are 3 bits
+CANONICAL_VALUE_BITS = 3
+# magic and version of all versions
+VERSION_HEADER = struct.Struct('<4sH')
+# versions 1-3: magic, version, height, width, entry bits, count of symmetries, symmetries checksum,
+# key space, count of entries
+HEADER = struct.Struct('<4sHBBBBIQQ')
+# version 4: magic, version, height, width, winning length, entry bits, count of symmetries, symmetries checksum,
+# count of valid positions (see ranking.PositionRanking), count of entries, solver name and flags
+CANONICAL_HEADER = struct.Struct('<4sHBBBBBIQQ8sB')
+# flags of version 4 tables: strengths of all reachable positions, depths of all positions of the table
+COMPLETE = 1
+DEPTHS = 2
+
+
+class TableException(Exception):
+    def __init__(self, message):
+        super(TableException, self).__init__(message)
+
+
+def symmetries_checksum(permutations):
+    """
+    Returns
+    ----------
+    (int) checksum of the equivalent permutations list.
+    """
+    return zlib.crc32(repr([list(p) for p in permutations])) & 0xffffffff
+
+
+def value_bits(version):
+    """
+    Returns
+    ----------
+    (int) bits of values of entries of the table version, depths are in the high bits.
+    """
+    return CANONICAL_VALUE_BITS if version == VERSION else VALUE_BITS
+
+
+def entry_bits(cells, version = VERSION):
+    """
+    Returns
+    ----------
+    (int) bits of entries of the table version for depths till the count of cells.
+    """
+    return 8 if cells + 1 < 2**(8 - value_bits(version)) else 16
+
+
+class TableDepths(object):
+    def __init__(self, table):
+        """
+        Depths of positions (see GameBoard.position_depth) of the table with the dictionary interface.
+
+        Parameters
+        ----------
+        table (MemoryTable): the table with depths in entries.
+        """
+        self.table = table
+        # depths which are not in the file
+        self.overlay = {}
+
+    def get(self, key, default = None):
+        depth = self.overlay.get(key)
+        if depth is None:
+            depth = self.table.file_depth(key)
+        return default if depth is None else depth
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        depth = self.get(key)
+        if depth is None:
+            raise KeyError(key)
+        return depth
+
+    def __setitem__(self, key, depth):
+        self.overlay[key] = depth
+
+    def __len__(self):
+        return len(dict(self.iteritems()))
+
+    def iteritems(self):
+        bits = self.table.value_bits
+        for key, entry in self.table.iterentries():
+            if entry >> bits and key not in self.overlay:
+                yield key, (entry >> bits) - 1
+        for item in self.overlay.iteritems():
+            yield item
+
+
+class MemoryTable(object):
+    def __init__(self, fname):
+        """
+        Read-only memory-mapped table of solved positions with the dictionary interface.
+        Pages of the file are loaded by the OS on demand, new values are stored in memory.
+
+        Parameters
+        ----------
+        fname (str): path to the table file.
+        """
+        with open(fname, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        if len(self.data) < VERSION_HEADER.size:
+            raise TableException('%s is not a table file.' % fname)
+        magic, version = VERSION_HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise TableException('%s is not a table file.' % fname)
+        if version == VERSION:
+            magic, version, self.height, self.width, self.winning_len, entry_bits, self.symmetries_count, \
+                self.checksum, self.key_space, self.entries_count, solver, self.flags = \
+                CANONICAL_HEADER.unpack_from(self.data)
+            self.solver = solver.rstrip('\0') or None
+            self.entries_offset = CANONICAL_HEADER.size
+        else:
+            magic, version, self.height, self.width, entry_bits, self.symmetries_count, \
+                self.checksum, self.key_space, self.entries_count = HEADER.unpack_from(self.data)
+            # the winning length, the solver and flags are not in tables before version 4
+            self.winning_len = self.solver = self.flags = None
+            self.entries_offset = HEADER.size
+        if entry_bits not in SUPPORTED_VERSIONS.get(version, []):
+            raise TableException('Unsupported table version %d with %d bits entries: %s' % (version, entry_bits, fname))
+        self.version = version
+        self.entry_bits = entry_bits
+        self.value_bits = value_bits(version)
+        self.value_mask = 2**self.value_bits - 1
+        # entries of ranked tables are indexed by ranks of unique ids
+        self.ranking = None
+        # entries of canonical tables are indexed by ranks of positions of the table
+        self.canonical = None
+        if version == RANKED_VERSION:
+            from ranking import PositionRanking
+            self.ranking = PositionRanking(self.height * self.width)
+        elif version == VERSION:
+            from ranking import CanonicalRanking
+            self.canonical = CanonicalRanking(self.height * self.width, self.data, self.entries_offset)
+            self.entries_offset += self.canonical.size
+            # entries are indexed by ranks of positions of the table
+            self.key_space = self.entries_count
+        # values which are not in the file
+        self.overlay = {}
+        # depths of positions, they are in the file since version 2
+        self.depths = TableDepths(self)
+
+    def __entry(self, key):
+        if self.canonical is not None:
+            key = self.canonical.rank(key)
+        elif self.ranking is not None:
+            key = self.ranking.rank_key(key)
+        if key is None or not 0 <= key < self.key_space:
+            return 0
+        return self.__entry_at(key)
+
+    def __entry_at(self, index):
+        if self.entry_bits == 4:
+            byte = ord(self.data[self.entries_offset + (index >> 1)])
+            return (byte >> ((index & 1) * 4)) & 0xf
+        if self.entry_bits == 8:
+            return ord(self.data[self.entries_offset + index])
+        offset = self.entries_offset + 2 * index
+        return ord(self.data[offset]) | (ord(self.data[offset + 1]) << 8)
+
+    def __file_value(self, key):
+        entry = self.__entry(key) & self.value_mask
+        return entry - 1 if entry else None
+
+    def file_depth(self, key):
+        """
+        Returns
+        ----------
+        (int) depth of the position from the file or None.
+        """
+        entry = self.__entry(key) >> self.value_bits
+        return entry - 1 if entry else None
+
+    def iterentries(self):
+        """
+        Iteration over all (key, entry) pairs of the file with non-zero entries.
+        """
+        if self.canonical is not None:
+            for rank, key in enumerate(self.canonical.iterkeys()):
+                entry = self.__entry_at(rank)
+                if entry:
+                    yield key, entry
+        elif self.ranking is not None:
+            for rank, entry in self.__iterentries():
+                yield self.ranking.unrank_key(rank), entry
+        else:
+            for item in self.__iterentries():
+                yield item
+
+    def __iterentries(self):
+        """
+        Iteration over all (index, entry) pairs of the file with non-zero entries.
+        """
+        data, offset = self.data, self.entries_offset
+        if self.entry_bits == 4:
+            for i in xrange(len(data) - offset):
+                byte = ord(data[offset + i])
+                for key, entry in ((2 * i, byte & 0xf), (2 * i + 1, byte >> 4)):
+                    if entry:
+                        yield key, entry
+        elif self.entry_bits == 8:
+            for key in xrange(len(data) - offset):
+                entry = ord(data[offset + key])
+                if entry:
+                    yield key, entry
+        else:
+            for key in xrange((len(data) - offset) // 2):
+                entry = ord(data[offset + 2 * key]) | (ord(data[offset + 2 * key + 1]) << 8)
+                if entry:
+                    yield key, entry
+
+    def get(self, key, default = None):
+        value = self.overlay.get(key)
+        if value is None:
+            value = self.__file_value(key)
+        return default if value is None else value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.overlay[key] = value
+
+    def __len__(self):
+        return self.entries_count + sum(1 for key in self.overlay if self.__file_value(key) is None)
+
+    def iteritems(self):
+        """
+        Iteration over all (key, value) pairs of the table.
+        """
+        for key, entry in self.iterentries():
+            entry &= self.value_mask
+            if entry and key not in self.overlay:
+                yield key, entry - 1
+        for item in self.overlay.iteritems():
+            yield item
+
+    def update(self, other):
+        for key, value in other.iteritems():
+            self[key] = value
+
+    def check(self, height, width, permutations, winning_len = None):
+        """
+        Check that the table is made for the game rules.
+
+        Parameters
+        ----------
+        height  (int):         tic tac toe board height.
+        width   (int):         tic tac toe board width.
+        permutations (list):   equivalent permutations which are used for unique ids.
+        winning_len (int):     length of winning combinations or None, it is checked since version 4.
+        """
+        if (self.height, self.width) != (height, width):
+            raise TableException('The table is made for the board %dx%d.' % (self.height, self.width))
+        if None not in (self.winning_len, winning_len) and self.winning_len != winning_len:
+            raise TableException('The table is made for the winning length %d.' % self.winning_len)
+        if (self.symmetries_count, self.checksum) != (len(permutations), symmetries_checksum(permutations)):
+            raise TableException('The table is made for other equivalent permutations.')
+
+
+def save_table(fname, memory, height, width, permutations, depths = None, version = VERSION, winning_len = None,
+               solver = None, flags = 0):
+    """
+    Save dictionary of solved positions to the table file.
+
+    Parameters
+    ----------
+    fname (str):           path to output file.
+    memory (dict):         values by unique ids.
+    height  (int):         tic tac toe board height.
+    width   (int):         tic tac toe board width.
+    permutations (list):   equivalent permutations which are used for unique ids.
+    depths (dict):         depths of positions by unique ids or None.
+    version (int):         VERSION for entries of positions of the table only, RANKED_VERSION for entries
+                           of all valid positions or RAW_VERSION for entries of all ternary values.
+    winning_len (int):     length of winning combinations, default is min(height, width).
+    solver (str):          name of the solver of the table or None, it is saved since version 4.
+    flags (int):           COMPLETE and DEPTHS flags of the table, they are saved since version 4.
+    """
+    if version not in [VERSION, RAW_VERSION, RANKED_VERSION]:
+        raise TableException('Table version %d can not be saved.' % version)
+    if winning_len is None: winning_len = min(height, width)
+    if depths is None: depths = {}
+    cells = height * width
+    bits = entry_bits(cells, version)
+    entry_bytes = bits // 8
+    version_value_bits = value_bits(version)
+
+    values = {}
+    for key, value in memory.iteritems():
+        if not 0 <= value < 2**version_value_bits - 1:
+            raise TableException('Value %d can not be stored in %d bits.' % (value, version_value_bits))
+        entry = value + 1
+        depth = depths.get(key)
+        if depth is not None:
+            entry |= (depth + 1) << version_value_bits
+        values[key] = entry
+
+    ranking = canonical_data = None
+    if version == VERSION:
+        from ranking import CanonicalRanking
+        try:
+            canonical_data = CanonicalRanking.build(cells, values)
+        except ValueError as e:
+            raise TableException(str(e))
+        ranking = CanonicalRanking(cells, canonical_data)
+        index = ranking.rank
+        key_space = len(ranking.positions)
+        entries_count = len(values)
+    elif version == RANKED_VERSION:
+        from ranking import PositionRanking
+        ranking = PositionRanking(cells)
+        index = ranking.rank_key
+        key_space = entries_count = len(ranking)
+    else:
+        index = lambda key : key
+        key_space = entries_count = 3**cells
+
+    entries = bytearray(entries_count * entry_bytes)
+    for key, entry in values.iteritems():
+        i = index(key)
+        if i is None:
+            raise TableException('Position %d is not valid.' % key)
+        for b in xrange(entry_bytes):
+            entries[i * entry_bytes + b] = (entry >> (8 * b)) & 0xff
+
+    checksum = symmetries_checksum(permutations)
+    if version == VERSION:
+        header = CANONICAL_HEADER.pack(MAGIC, version, height, width, winning_len, bits, len(permutations),
+                                       checksum, key_space, len(values), solver or '', flags) + canonical_data
+    else:
+        header = HEADER.pack(MAGIC, version, height, width, bits, len(permutations), checksum, key_space, len(values))
+    # the old file can be memory-mapped: the new one replaces it by renaming
+    tmp_fname = fname + '.tmp'
+    with open(tmp_fname, 'wb') as f:
+        f.write(header)
+        f.write(entries)
+    os.rename(tmp_fname, fname)
+
+
+class TableRegistry(object):
+    def __init__(self, max_tables = None):
+        """
+        Process-wide registry of solved tables shared by all game boards.
+        Every table is loaded (or solved) at most once per process. Tables derived from the solved table
+        (depths, the book) are keyed by the rules key and their name, they are evicted with the solved table:
+        the registry keeps the least recently used rules with all their tables.
+
+        Parameters
+        ----------
+        max_tables (int): maximal count of rules, tables of the least recently used rules are evicted;
+                          None is no limit.
+        """
+        self.max_tables = max_tables
+        # tables by keys by rules keys
+        self.tables = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, loader):
+        """
+        Returns
+        ----------
+        (dict) the table by key, it is made by loader() if the table is not in the registry.
+
+        Parameters
+        ----------
+        key (tuple):         (height, width, rules) of the game or (height, width, rules, name) of derived tables.
+        loader (callable):   function without arguments which returns a new table.
+        """
+        with self.lock:
+            # the rules become the most recently used
+            tables = self.tables.pop(key[:3], {})
+            if key not in tables:
+                tables[key] = loader()
+            self.tables[key[:3]] = tables
+            self.__evict()
+            return tables[key]
+
+    def set_max_tables(self, max_tables):
+        with self.lock:
+            self.max_tables = max_tables
+            self.__evict()
+
+    def __evict(self):
+        if self.max_tables is not None:
+            while len(self.tables) > self.max_tables:
+                self.tables.popitem(last = False)
+
+    def evict(self, key):
+        """
+        Drop the table from the registry, the next game board reloads it.
+        Derived tables are dropped with the solved table of the rules key.
+        """
+        with self.lock:
+            if key == key[:3]:
+                self.tables.pop(key, None)
+            elif key[:3] in self.tables:
+                self.tables[key[:3]].pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.tables.clear()
+
+    def __contains__(self, key):
+        return key in self.tables.get(key[:3], {})
+
+    def __len__(self):
+        return sum(len(tables) for tables in self.tables.values())
+
+
+# solved tables of the process
+REGISTRY = TableRegistry()
@@ -0,0 +1,264 @@
+# external imports:
+from time import time
+
+# internal imports:
+from bitboard import BitBoard
+from gameboard import GameBoard, LABELS
+
+
+# depth of threat sequences (count of attacker moves)
+THREATS_DEPTH = 12
+# nodes budget of one threat sequences search
+THREATS_NODES = 2000
+# count of the best heuristic moves which are checked against the enemy threat sequences
+CHECKED_MOVES = 4
+# heuristic weights of stencils by count of labels of one player
+STENCIL_WEIGHT_BASE = 4
+
+
+count_bits = lambda x : bin(x).count('1')
+
+def bit_indicies(mask):
+    """
+    Returns
+    ----------
+    (list) indicies of the set bits.
+    """
+    indicies = []
+    while mask:
+        lowest = mask & -mask
+        mask ^= lowest
+        indicies.append(lowest.bit_length() - 1)
+    return indicies
+
+
+class ThreatSearch(object):
+    def __init__(self, game_board, max_depth = THREATS_DEPTH, max_nodes = THREATS_NODES):
+        """
+        Threat-space search for m,n,k-games.
+        A threat is a move which makes a stencil with winning_len - 1 labels of the attacker
+        and one empty cell, so the defender reply is forced. A sequence of threats is a forced win
+        if it ends by a double threat (two winning cells) while the defender has no own winning cell.
+        Only forced moves are expanded, so the search does not depend on the board size.
+
+        Parameters
+        ----------
+        game_board (GameBoard): a game board which defines the game rules.
+        max_depth (int):        maximal count of attacker moves in a sequence.
+        max_nodes (int):        nodes budget of one search.
+        """
+        self.game_board = game_board
+        self.size = game_board.tmask_width
+        self.winning_len = game_board.winning_len
+        # ternary keys are not needed for the search: one zero weight per cell
+        self.board = BitBoard(game_board.height, game_board.width, game_board.stencils,
+                              LABELS, [(0,)] * self.size)
+        self.stencil_masks = self.board.stencil_masks
+        self.cell_stencils = game_board.cell_stencils
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        # count of visited nodes of all searches and the nodes limit of the current search
+        self.nodes = 0
+        self.nodes_limit = max_nodes
+
+    def __winning_cells(self, own, enemy, stencils = None):
+        """
+        Empty cells which complete some stencil for the player.
+
+        Parameters
+        ----------
+        own   (int):     bitmask of the player labels.
+        enemy (int):     bitmask of the enemy labels.
+        stencils (int):  bitmask of checked stencils indicies, default is all stencils.
+
+        Returns
+        ----------
+        (int) bitmask of the cells.
+        """
+        cells = 0
+        stencil_masks = self.stencil_masks
+        indicies = xrange(len(stencil_masks)) if stencils is None else bit_indicies(stencils)
+        for i in indicies:
+            mask = stencil_masks[i]
+            if mask & enemy:
+                continue
+            missing = mask & ~own
+            if missing and missing & (missing - 1) == 0:
+                cells |= missing
+        return cells
+
+    def __threat_moves(self, own, enemy):
+        """
+        Moves which make threats: empty cells of stencils with winning_len - 2 labels of the player.
+
+        Returns
+        ----------
+        (list) indicies of cells, cells which make more threats are first.
+        """
+        threats = {}
+        for mask in self.stencil_masks:
+            if mask & enemy:
+                continue
+            missing = mask & ~own
+            if count_bits(missing) == 2:
+                for i in bit_indicies(missing):
+                    threats[i] = threats.get(i, 0) + 1
+        return sorted(threats, key = lambda i : (-threats[i], i))
+
+    def __search(self, own, enemy, depth, failed):
+        """
+        Threat sequences search for the player which moves.
+
+        Parameters
+        ----------
+        own   (int):     bitmask of the attacker labels.
+        enemy (int):     bitmask of the defender labels.
+        depth (int):     remaining count of attacker moves.
+        failed (set):    positions without forced wins (by the masks).
+
+        Returns
+        ----------
+        (list) moves of the attacker and forced replies of the defender or None.
+        """
+        self.nodes += 1
+        wins = self.__winning_cells(own, enemy)
+        if wins:
+            return bit_indicies(wins)[:1]
+        if depth == 0 or self.nodes >= self.nodes_limit or (own, enemy) in failed:
+            return None
+
+        enemy_wins = self.__winning_cells(enemy, own)
+        if count_bits(enemy_wins) > 1:
+            return None
+        moves = self.__threat_moves(own, enemy)
+        if enemy_wins:
+            # the attacker must block the enemy, the block must be a threat too
+            moves = [i for i in moves if enemy_wins == 1 << i]
+
+        for i in moves:
+            bit = 1 << i
+            new_own = own | bit
+            gains = self.__winning_cells(new_own, enemy, self.cell_stencils[i])
+            if count_bits(gains) > 1:
+                # double threat: the defender can block one cell only
+                return [i]
+            if gains:
+                reply = gains.bit_length() - 1
+                sequence = self.__search(new_own, enemy | gains, depth - 1, failed)
+                if sequence is not None:
+                    return [i, reply] + sequence
+        if self.nodes < self.nodes_limit:
+            failed.add((own, enemy))
+        return None
+
+    def __load(self, position):
+        """
+        Returns
+        ----------
+        (int) bitmask of labels of the player which moves.
+        (int) bitmask of labels of the enemy.
+        """
+        board = self.board
+        board.load(position)
+        self.game_board.player_label(position)
+        if board.player_index() == 0:
+            return board.x_mask, board.o_mask
+        return board.o_mask, board.x_mask
+
+    def __find_win(self, own, enemy):
+        self.nodes_limit = self.nodes + self.max_nodes
+        return self.__search(own, enemy, self.max_depth, set())
+
+    def find_win(self, position):
+        """
+        Forced win of the player which moves from the position by a sequence of threats.
+
+        Parameters
+        ----------
+        position (str): a position in the text representation.
+
+        Returns
+        ----------
+        (list) cells indicies of the attacker moves and the defender replies or None if a win is not found.
+        """
+        own, enemy = self.__load(position)
+        return self.__find_win(own, enemy)
+
+    def __scores(self, own, enemy):
+        """
+        Heuristic scores of empty cells: every stencil with labels of only one player
+        weights its empty cells by the count of labels (attack is preferred to defense).
+
+        Returns
+        ----------
+        (dict) scores by cells indicies.
+        """
+        scores = {}
+        for mask in self.stencil_masks:
+            own_in, enemy_in = mask & own, mask & enemy
+            if own_in and enemy_in:
+                continue
+            if own_in:
+                score = 2 * STENCIL_WEIGHT_BASE**count_bits(own_in)
+            elif enemy_in:
+                score = STENCIL_WEIGHT_BASE**count_bits(enemy_in)
+            else:
+                score = 1
+            for i in bit_indicies(mask & ~(own | enemy)):
+                scores[i] = scores.get(i, 0) + score
+        return scores
+
+    def best_move(self, position):
+        """
+        The move for the player which moves from the position:
+        a win, a block of the enemy win, a threat sequence, a defense against
+        the enemy threat sequences or the best heuristic move.
+
+        Parameters
+        ----------
+        position (str): a position in the text representation.
+
+        Returns
+        ----------
+        (int) index of the cell.
+        """
+        own, enemy = self.__load(position)
+        empty = ((1 << self.size) - 1) & ~(own | enemy)
+        wins = self.__winning_cells(own, enemy)
+        if wins:
+            return bit_indicies(wins)[0]
+        enemy_wins = self.__winning_cells(enemy, own)
+        if enemy_wins:
+            return bit_indicies(enemy_wins)[0]
+        sequence = self.__find_win(own, enemy)
+        if sequence is not None:
+            return sequence[0]
+
+        scores = self.__scores(own, enemy)
+        moves = sorted(bit_indicies(empty), key = lambda i : (-scores.get(i, 0), i))
+        enemy_sequence = self.__find_win(enemy, own)
+        if enemy_sequence is not None:
+            # cells of the enemy threat sequence are tried first
+            defense = [i for i in enemy_sequence if empty & (1 << i)]
+            moves = sorted(set(defense), key = moves.index) + [i for i in moves if i not in defense]
+        for i in moves[:CHECKED_MOVES]:
+            if self.__find_win(enemy, own | (1 << i)) is None:
+                return i
+        return moves[0]
+
+
+def main():
+    for h, w, k in [(7, 7, 4), (15, 15, 5)]:
+        gb = GameBoard(h, w, winning_len = k)
+        engine = ThreatSearch(gb)
+        t = time()
+        moves = 0
+        while not gb.game_over():
+            i = engine.best_move(gb.position)
+            gb.update_position(i / w + 1, i % w + 1)
+            moves += 1
+        print '%dx%d k=%d: %s after %d moves, %.3f s per move' % (h, w, k, gb.status(), moves, (time() - t) / moves)
+
+
+if __name__ == '__main__':
+    main()
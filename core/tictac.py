@@ -1,4 +1,4 @@
-from gameboard import GameBoard
+from gameboard import GameBoard, GameBoardException, X_LABEL
 from player import Player, AI, PlayerException
 from utils import die
 
@@ -10,6 +10,8 @@ class TicTacToeException(Exception):
 class TicTacToe(object):
     """
     Main class of game process.
+    The game is driven by steps (start, submit_move, pending_ai_move), so one event loop
+    or thread can drive any number of games; play is the blocking loop by these steps.
     """
     def __init__(self, board, player1, player2, show_callback = None):
         """
@@ -25,19 +27,100 @@ class TicTacToe(object):
         self.players = [player1, player2]
         self.game_board = board
         self.show_info = show_callback if show_callback is not None else self.text_show
+        self.started = False
 
     def play(self):
         """
         Run the game.
         """
-        player_index = 0
-        self.show_info()
+        self.start()
         while not self.game_over():
-            self.players[player_index].move(self.game_board)
-            self.show_info()
-            player_index = (player_index + 1) % 2
+            task = self.pending_ai_move()
+            if task is not None:
+                self.submit_move(*task())
+            else:
+                self.current_player().move(self.game_board)
+                self.show_info()
+
+        self.show_info()
+        self.close()
+
+    def start(self):
+        """
+        Start the game from the current position of the game board.
+
+        Returns
+        ----------
+        (dict) the game state (see state).
+        """
+        self.started = True
+        self.show_info()
+        return self.state()
+
+    def current_player(self):
+        """
+        Returns
+        ----------
+        (Player) the player which moves now or None if the game is over.
+        """
+        if self.game_over():
+            return None
+        gb = self.game_board
+        return self.players[0 if gb.player_label(gb.position) == X_LABEL else 1]
+
+    def submit_move(self, i, j):
+        """
+        Make the move of the current player: the user input or the result of pending_ai_move.
+
+        Parameters
+        ----------
+        i  (int):   the first coordinate (from 1 to height).
+        j  (int):   the second coordinate (from 1 to width).
 
+        Returns
+        ----------
+        (dict) the game state (see state).
+        """
+        if not self.started:
+            raise TicTacToeException('The game is not started.')
+        if self.game_over():
+            raise TicTacToeException('The game is over.')
+        self.game_board.update_position(i, j)
         self.show_info()
+        if self.game_over():
+            self.close()
+        return self.state()
+
+    def pending_ai_move(self):
+        """
+        The move of the automatic player which moves now (see Player.automatic).
+        The returned function does not change the game, so it can be executed by any thread
+        or executor, and its result is passed to submit_move.
+
+        Returns
+        ----------
+        (callable) function without arguments which returns coordinates of the move
+                   or None if the game is over or waits for the user input.
+        """
+        player = self.current_player()
+        if player is None or not player.automatic:
+            return None
+        game_board = self.game_board
+        return lambda : player.next_move(game_board)
+
+    def state(self):
+        """
+        Returns
+        ----------
+        (dict) the position, the player label which moves, game over flag, the status text,
+               winning combinations and what the game waits for: 'input', 'ai' or None.
+        """
+        gb = self.game_board
+        player = self.current_player()
+        waiting = None if player is None else ('ai' if player.automatic else 'input')
+        return {'position' : gb.position, 'player' : gb.player_label(gb.position),
+                'game_over' : gb.game_over(), 'status' : gb.status(),
+                'winning' : gb.winning_indicies(), 'waiting' : waiting}
 
     def text_show(self):
         """
@@ -61,16 +144,30 @@ class TicTacToe(object):
         """
         return self.game_board.game_over()
 
+    def close(self):
+        """
+        Release resources of players (see Player.close), it is called when the game is over.
+        """
+        for player in self.players:
+            player.close()
+
 
 def main():
-    width, height = -1, -1
-    bad = lambda x : x != 3 and x != 4
-    while bad(width) or bad(height):
-        height, width = [int(x) for x in raw_input("Enter height and width of game board: ").split()]
+    while True:
+        try:
+            sizes = [int(x) for x in raw_input("Enter height, width and optionally winning length of game board: ").split()]
+            if len(sizes) not in [2, 3] or min(sizes) < 1:
+                raise ValueError()
+            gb = GameBoard(sizes[0], sizes[1], bitboard = True, winning_len = sizes[2] if len(sizes) == 3 else None)
+            break
+        except ValueError:
+            print('Wrong format, two or three positive integer values needed.')
+        except GameBoardException as GBE:
+            print(GBE.message)
 
-    gb = GameBoard(height, width)
     p1 = Player()
-    p2 = AI()
+    # replies are searched while the user enters the move
+    p2 = AI(ponder = True)
     ttoe = TicTacToe(gb, p1, p2)
     ttoe.play()
 
@@ -1,5 +1,7 @@
 # some special functions for debugging
+import json
 import sys
+from time import time
 
 
 add = lambda a, b : a + b
@@ -23,11 +25,84 @@ def memoized_by_uid(some_class_method):
         else:
             value = some_class_method(self, *args, **kwargs)
             memory[uid] = value
-            if len(memory) % 100 == 0:
-                print len(memory)
+            stats = getattr(self, 'stats', None)
+            if stats is not None:
+                stats.memo_misses += 1
+                # structured line with the memory size instead of printing
+                stats.tick(len(memory), memory = len(memory))
             return value
     return wrapped
 
+class Stats(object):
+    def __init__(self, name, fields, emitter = None, every = 1000):
+        """
+        Resettable counters of an engine. Counters are plain attributes (stats.nodes += 1),
+        they can be emitted periodically as JSON lines.
+
+        Parameters
+        ----------
+        name (str):            name of the engine in emitted lines.
+        fields (list):         names of counters.
+        emitter (callable):    function which gets an emitted line or None.
+        every (int):           period of emission (see tick).
+        """
+        self.name = name
+        self.fields = list(fields)
+        self.emitter = emitter
+        self.every = every
+        self.reset()
+
+    def reset(self):
+        for field in self.fields:
+            setattr(self, field, 0)
+
+    def as_dict(self):
+        """
+        Returns
+        ----------
+        (dict) values of counters by names.
+        """
+        return dict((field, getattr(self, field)) for field in self.fields)
+
+    def set_emitter(self, emitter, every = None):
+        """
+        Set the emitter of structured lines, None disables emission.
+        """
+        self.emitter = emitter
+        if every is not None:
+            self.every = every
+
+    def tick(self, count, **extra):
+        """
+        Emit counters if the emitter is set and count is a multiple of the period.
+
+        Parameters
+        ----------
+        count (int):   value of some growing counter.
+        extra (dict):  additional values of the line.
+        """
+        if self.emitter is not None and count % self.every == 0:
+            self.emit(**extra)
+
+    def emit(self, **extra):
+        values = self.as_dict()
+        values.update(extra)
+        values['stats'] = self.name
+        values['time'] = time()
+        self.emitter(json.dumps(values, sort_keys = True))
+
+
+def stream_emitter(stream = sys.stderr):
+    """
+    Returns
+    ----------
+    (callable) emitter which writes lines to the stream (see Stats).
+    """
+    def emit(line):
+        stream.write(line + '\n')
+        stream.flush()
+    return emit
+
 # count of values in dictionary[key]
 def count_of(dictionary, key):
     return len(dictionary[key]) if key in dictionary else 0        
\ No newline at end of file
@@ -1,9 +1,31 @@
-from core import gameboard
+import argparse
+import json
+
+from core import build
 
 
 def main():
-	gameboard.main()
+	parser = argparse.ArgumentParser(description = 'Build solved tables and books of the best moves.')
+	parser.add_argument('sizes', nargs = '*', type = build.parse_size, default = build.SIZES,
+						help = 'board sizes HxW or HxW:K with the winning length K, default is 3x3 3x4 4x3')
+	parser.add_argument('--solver', choices = build.SOLVERS, default = 'full', help = 'solver engine')
+	parser.add_argument('--format', choices = build.FORMATS, default = 'tbl', help = 'format of tables')
+	parser.add_argument('-j', '--jobs', type = int, default = 1, help = 'count of worker processes, 0 is count of CPU')
+	parser.add_argument('-o', '--output', default = build.DUMP_DIR, help = 'output directory')
+	parser.add_argument('-f', '--force', action = 'store_true', help = 'rebuild tables which are up to date')
+	parser.add_argument('--cache-dir', default = None, help = 'directory of persistent solver caches (the full solve is resumed)')
+	parser.add_argument('--json', default = None, help = 'save reports of tables as JSON to the file')
+	args = parser.parse_args()
+
+	try:
+		reports = build.build(args.sizes, args.solver, args.format, args.jobs or None, args.output, args.force, args.cache_dir)
+	except build.TableException as e:
+		parser.error(str(e))
+	print build.format_totals(reports)
+	if args.json is not None:
+		with open(args.json, 'w') as f:
+			json.dump(reports, f, indent = 2, sort_keys = True)
 
 
 if __name__ == '__main__':
-	main()
\ No newline at end of file
+	main()
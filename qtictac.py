@@ -4,7 +4,7 @@
 from os.path import join
 
 # PyQt5
-from PyQt5 import QtCore, QtWidgets, QtGui
+from PyQt5 import QtWidgets, QtGui
 from PyQt5.QtGui import QIcon
 
 from PyQt5.QtWidgets import QWidget, QPushButton, QLabel, QDialog
@@ -16,7 +16,7 @@ from PyQt5.QtCore import QThread
 
 # internal imports
 from core.tictac import TicTacToe
-from core.gameboard import GameBoard
+from core.gameboard import GameBoard, GameBoardException
 from core.player import Player, AI
 from core.utils import add
 
@@ -66,15 +66,31 @@ class ChoosePlayerDialog(QDialog):
         return callback
 
 
+class AIMoveThread(QThread):
+    # signal with coordinates of the calculated move
+    move_signal = pyqtSignal(int, int)
+    def __init__(self, parent, task):
+        """
+        Calculation of one AI move (see TicTacToe.pending_ai_move) in another thread.
+        """
+        super(AIMoveThread, self).__init__(parent)
+        self.task = task
+
+    def run(self):
+        self.move_signal.emit(*self.task())
+
+
 class TicTacWidget(QWidget):
     # signal for game board updating
     update_board_signal = pyqtSignal()
     def __init__(self, parent, height, width):
         super(TicTacWidget, self).__init__(parent)
 
-        game_board = GameBoard(height, width)
-        user = Player(interface_callback = self.user_input)
-        robot = AI()
+        game_board = GameBoard(height, width, bitboard = True)
+        # moves of the user are submitted by buttons clicking
+        user = Player()
+        # replies are searched while the user chooses the move
+        robot = AI(ponder = True)
 
         user_choise = ChoosePlayerDialog()
         user_choise.exec_()
@@ -83,30 +99,47 @@ class TicTacWidget(QWidget):
         self.tictac = TicTacToe(game_board, player_1, player_2, show_callback=self.update_board_signal.emit)
         self.update_board_signal.connect(self.update_game_status)
 
-        # a bit overhead for user input organization
-        self.user_input_wait_condition = QtCore.QWaitCondition()
-        self.user_input_wait_mutex = QtCore.QMutex()
-        self.user_input_data = None
-        
+        # the thread of the current AI move or None
+        self.ai_thread = None
+        self.closed = False
+
         self.initBoard()
 
-        self.game_loop()
+        self.tictac.start()
+        self.next_step()
 
-        
-    def game_loop(self):
+    def next_step(self):
+        """
+        Start the AI move in another thread if the game waits for it.
+        The game is driven by the Qt event loop, buttons are disabled while AI is thinking.
         """
-        Run a game loop in another thread.
+        task = self.tictac.pending_ai_move()
+        if task is None or self.closed:
+            return
+        self.set_buttons_enabled(False)
+        self.ai_thread = AIMoveThread(self, task)
+        self.ai_thread.move_signal.connect(self.ai_move_done)
+        self.ai_thread.start()
+
+    def ai_move_done(self, i, j):
         """
-        class GameLoop(QThread):
-            def __init__(self, parent, tictac):
-                super(GameLoop, self).__init__(parent)
-                self.tictac = tictac
-            def run(self):
-                self.tictac.play()
+        Calls in the Qt event loop after the AI move calculation.
+        """
+        self.ai_thread = None
+        if self.closed:
+            return
+        self.tictac.submit_move(i, j)
+        self.next_step()
 
-        self.gameloop = GameLoop(self, self.tictac)
-        # Run in new thread
-        self.gameloop.start()
+    def close_game(self):
+        """
+        Abandon the game: the result of the current AI move is dropped.
+        Only one move can be calculated, so waiting for it is short.
+        """
+        self.closed = True
+        if self.ai_thread is not None:
+            self.ai_thread.wait()
+        self.tictac.close()
 
     def initBoard(self):
         """
@@ -141,15 +174,6 @@ class TicTacWidget(QWidget):
         label = self.tictac.game_board.label(i + 1, j + 1)
         return self.button_icons[label]
 
-    def user_input(self, game_board):
-        """
-        User input callback. Waiting for button clicking.
-        """
-        self.user_input_wait_mutex.lock()
-        self.user_input_wait_condition.wait(self.user_input_wait_mutex)
-        self.user_input_wait_mutex.unlock()
-        return self.user_input_data
-
     def update_game_status(self, game_over = False):
         """
         Calls after emitting signal for gameboard updating.
@@ -172,6 +196,16 @@ class TicTacWidget(QWidget):
                     button = item.widget()    
                     button.setEnabled((i + 1, j + 1) in enabled_positions)
 
+    def set_buttons_enabled(self, enabled):
+        """
+        Enable or disable buttons of empty cells.
+        """
+        gb = self.tictac.game_board
+        for i in xrange(gb.height):
+            for j in xrange(gb.width):
+                button = self.grid.itemAtPosition(i, j).widget()
+                button.setEnabled(enabled and gb.label(i + 1, j + 1) == ' ')
+
     def update_buttons_grid(self):
         """
         Update buttons grid.
@@ -188,13 +222,19 @@ class TicTacWidget(QWidget):
     def set_label(self, *position):
         """
         Put label on some position.
-        This function wakes up self.user_input function.
-        After then gameloop is continued and emiting  signal for the game board updating...
+        The user move is submitted to the game, the game board is updated by the signal
+        and the AI move is started.
         """
         def calluser():
             i, j = position
-            self.user_input_data = i + 1, j + 1
-            self.user_input_wait_condition.wakeAll()
+            if self.ai_thread is not None or self.tictac.state()['waiting'] != 'input':
+                return
+            try:
+                self.tictac.submit_move(i + 1, j + 1)
+            except GameBoardException as GBE:
+                self.parent().statusBar().showMessage(GBE.message)
+                return
+            self.next_step()
         return calluser
 
    
@@ -75,9 +75,8 @@ class QTicTacToe(QMainWindow):
         def ng_callback():
             # function for making new gameboard with some fixed height(h) and width(w)
             if hasattr(self, 'tictactoe_widget'):
-                # closing gameloop thread before substituting 'tictactoe_widget'
-                if self.tictactoe_widget.gameloop.isRunning():
-                    self.tictactoe_widget.gameloop.terminate()
+                # abandon the game before substituting 'tictactoe_widget'
+                self.tictactoe_widget.close_game()
             self.tictactoe_widget = TicTacWidget(self, h, w)
             self.setCentralWidget(self.tictactoe_widget)
 
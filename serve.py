@@ -0,0 +1,18 @@
+import argparse
+
+from core import server
+
+
+def main():
+	parser = argparse.ArgumentParser(description = 'Tic tac toe server: JSON lines over TCP or Unix socket.')
+	parser.add_argument('address', nargs = '?', default = '127.0.0.1:8765', help = 'host:port, port or path of Unix socket')
+	parser.add_argument('-w', '--workers', type = int, default = server.WORKERS, help = 'count of processes for AI searches')
+	args = parser.parse_args()
+
+	game_server = server.GameServer(server.parse_address(args.address), args.workers)
+	print 'serving on %s' % (game_server.address,)
+	game_server.serve_forever()
+
+
+if __name__ == '__main__':
+	main()
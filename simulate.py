@@ -0,0 +1,30 @@
+import argparse
+import json
+
+from core import simulator
+from core.player import AI_SOLVERS
+
+
+def main():
+	parser = argparse.ArgumentParser(description = 'Headless AI games simulator.')
+	parser.add_argument('height', type = int, help = 'game board height')
+	parser.add_argument('width', type = int, help = 'game board width')
+	parser.add_argument('-k', '--winning-len', type = int, default = None, help = 'length of winning combinations')
+	parser.add_argument('-n', '--games', type = int, default = 100, help = 'count of games')
+	parser.add_argument('-p', '--players', default = 'ai:ai', help = 'kinds of players: ai:ai, ai:random, random:ai')
+	parser.add_argument('-j', '--jobs', type = int, default = None, help = 'count of worker processes, default is count of CPU')
+	parser.add_argument('--solver', choices = AI_SOLVERS, default = 'full', help = 'AI solver engine name')
+	parser.add_argument('--budget-ms', type = int, default = None, help = 'AI time budget of a move in milliseconds')
+	parser.add_argument('--max-nodes', type = int, default = None, help = 'AI nodes budget of a move')
+	parser.add_argument('--seed', type = int, default = None, help = 'random seed')
+	parser.add_argument('--json', action = 'store_true', help = 'print the report as JSON')
+	args = parser.parse_args()
+
+	ai_options = {'solver' : args.solver, 'budget_ms' : args.budget_ms, 'max_nodes' : args.max_nodes}
+	report = simulator.simulate(args.height, args.width, args.games, args.players.split(':'), args.jobs,
+								args.winning_len, ai_options, args.seed)
+	print json.dumps(report, sort_keys = True) if args.json else simulator.format_report(report)
+
+
+if __name__ == '__main__':
+	main()